@@ -0,0 +1,283 @@
+#!/bin/python
+
+"""Benchmarks of digimat.bac0 against simulated BACnet/IP devices on the loopback interface.
+
+The simulated devices (BAC0 local objects) are started in a child process, each device being bound to it's own
+loopback address (127.0.0.2, 127.0.0.3, ...), with a configurable number of points, object types and response
+latency. The node under test (a BAC object bound to 127.0.0.1) then drives discovery, refresh, COV, bulk writes
+and dumps against them, and the results are written as JSON, to be compared between versions : throughput,
+p50/p99 wall time of each operation (i.e. a whole device refresh) and, per BACnet service, the number of requests
+sent with their p50/p99 latency (bucket upper bounds of the BACMetrics histograms).
+
+    python benchmarks/bacbench.py --devices 4 --points 200 --latency 0.005 --output bench.json
+
+Loopback broadcasts being unreliable, devices are discovered with a unicast whois on each address.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import select
+import subprocess
+import sys
+import time
+
+OBJECT_TYPES={'ai': 'analog_input', 'av': 'analog_value', 'bv': 'binary_value', 'msv': 'multistate_value'}
+FIRST_DEVICE_ID=9000
+
+
+def address(n):
+    return '127.0.0.%d' % (n+2)
+
+
+def simulate(args):
+    """run the simulated devices until stdin is closed (child process)"""
+    import BAC0
+    from BAC0.core.devices.local import models
+    from BAC0.core.devices.local.object import ObjectFactory
+    from bacpypes.task import FunctionTask
+
+    types=args.types.split(',')
+    devices=[]
+    for n in range(args.devices):
+        app=BAC0.lite(ip='%s/24' % address(n), deviceId=FIRST_DEVICE_ID+n, localObjName='bench-%d' % n)
+        ObjectFactory.clear_objects()
+        objects=None
+        for instance in range(args.points):
+            otype=types[instance % len(types)]
+            factory=getattr(models, OBJECT_TYPES[otype])
+            kwargs={'instance': instance, 'name': '%s_%d' % (otype, instance), 'description': 'bench %s %d' % (otype, instance)}
+            if otype!='ai':
+                kwargs['is_commandable']=True
+            if otype=='msv':
+                kwargs['properties']={'stateText': models.make_state_text(['off', 'low', 'high'])}
+                kwargs['presentValue']=1
+            elif otype=='bv':
+                kwargs['presentValue']=False
+            else:
+                kwargs['properties']={'units': 'degreesCelsius'}
+                kwargs['presentValue']=20.0
+            objects=factory(**kwargs)
+        if objects is not None:
+            objects.add_objects_to_application(app)
+
+        if args.latency>0:
+            # delay every response of the device without blocking the (shared) bacpypes core
+            application=app.this_application
+
+            def delayed(apdu, response=application.response):
+                FunctionTask(response, apdu).install_task(delta=args.latency)
+
+            application.response=delayed
+        devices.append(app)
+
+    print('ready', flush=True)
+
+    # change the analog values periodically to generate COV notifications
+    step=0
+    while True:
+        if sys.stdin in _readable(args.changeInterval):
+            if not sys.stdin.readline():
+                break
+        step+=1
+        for app in devices:
+            for obj in app.this_application.iter_objects():
+                try:
+                    if obj.objectIdentifier[0]=='analogValue':
+                        obj.presentValue=20.0+(step % 10)
+                except:
+                    pass
+
+    for app in devices:
+        app.disconnect()
+
+
+def _readable(timeout):
+    return select.select([sys.stdin], [], [], timeout)[0]
+
+
+class Timings(object):
+    """Wall times of repeated operations (an operation may send many requests, i.e. a device refresh)"""
+    def __init__(self, name, unit='operation'):
+        self._name=name
+        self._unit=unit
+        self._durations=[]
+        self._items=0
+
+    def record(self, duration, items=1):
+        self._durations.append(duration)
+        self._items+=items
+
+    @contextlib.contextmanager
+    def measure(self, items=1):
+        t0=time.perf_counter()
+        yield
+        self.record(time.perf_counter()-t0, items)
+
+    def quantile(self, q):
+        durations=sorted(self._durations)
+        if durations:
+            return durations[min(len(durations)-1, int(q*len(durations)))]
+
+    def result(self):
+        total=sum(self._durations)
+        return {'count': len(self._durations),
+                'items': self._items,
+                'unit': self._unit,
+                'seconds': total,
+                'throughput': self._items/total if total else None,
+                'operationWallTime': {'p50': self.quantile(0.5), 'p99': self.quantile(0.99)}}
+
+
+def requests(bacnet):
+    """return the number of requests sent by the node and their latency (seconds), per service (all devices merged)"""
+    merged={}
+    for metrics in bacnet.metrics.services():
+        item=merged.setdefault(metrics.service, {'count': 0, 'sum': 0.0, 'buckets': None})
+        item['count']+=metrics.count
+        item['sum']+=metrics.sum
+        buckets=metrics.cumulativeBuckets()
+        if item['buckets'] is None:
+            item['buckets']=buckets
+        else:
+            item['buckets']=[(bound, total+buckets[n][1]) for n, (bound, total) in enumerate(item['buckets'])]
+
+    def quantile(item, q):
+        for bound, total in item['buckets']:
+            if total>=q*item['count']:
+                return bound
+
+    results={}
+    for service, item in merged.items():
+        if item['count']:
+            results[service]={'count': item['count'],
+                              'latency': {'mean': item['sum']/item['count'],
+                                          'p50': quantile(item, 0.5),
+                                          'p99': quantile(item, 0.99)}}
+    return results
+
+
+def bench(bacnet, args):
+    results={}
+
+    def run(name, function):
+        bacnet.metrics.reset()
+        timings=function()
+        result=timings.result()
+        result['requests']=requests(bacnet)
+        results[name]=result
+        sys.stderr.write('%s: %s\n' % (name, json.dumps(result)))
+
+    def discover():
+        timings=Timings('discover', 'device')
+        for n in range(args.devices):
+            with timings.measure():
+                bacnet.discover(address(n), poll=0)
+        return timings
+
+    def refresh():
+        timings=Timings('refresh', 'point')
+        for i in range(args.iterations):
+            for device in bacnet.devices():
+                with timings.measure(device.count()):
+                    device.refresh()
+        return timings
+
+    def cov():
+        timings=Timings('cov', 'subscription')
+        for device in bacnet.devices():
+            with timings.measure(device.count()):
+                device.points.cov(300)
+        return timings
+
+    def notifications():
+        timings=Timings('notifications', 'event')
+        with bacnet.changes(maxsize=1000000) as consumer:
+            t0=time.perf_counter()
+            time.sleep(args.duration)
+            timings.record(time.perf_counter()-t0, len(consumer.getAll()))
+        for device in bacnet.devices():
+            device.points.covCancel()
+        return timings
+
+    def writes():
+        timings=Timings('writes', 'write')
+        for i in range(args.iterations):
+            for device in bacnet.devices():
+                bag=device.bag()
+                bag.add(device.points.select(type='analogValue'))
+                values=[(point, 10.0+i) for point in bag]
+                with timings.measure(len(values)):
+                    bag.write(values, priority=8)
+        return timings
+
+    def dumps():
+        timings=Timings('dump', 'point')
+        for i in range(args.iterations):
+            for device in bacnet.devices():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    with timings.measure(device.count()):
+                        device.points.dump(cached=True)
+        return timings
+
+    run('discover', discover)
+    run('refresh', refresh)
+    run('cov', cov)
+    run('notifications', notifications)
+    run('writes', writes)
+    run('dump', dumps)
+    return results
+
+
+def main():
+    parser=argparse.ArgumentParser(description='digimat.bac0 benchmarks against simulated BACnet/IP devices')
+    parser.add_argument('--devices', type=int, default=4, help='number of simulated devices')
+    parser.add_argument('--points', type=int, default=200, help='number of points of each device')
+    parser.add_argument('--types', type=str, default='ai,av,bv,msv', help='object types of the points (%s)' % ','.join(OBJECT_TYPES))
+    parser.add_argument('--latency', type=float, default=0.0, help='response latency of the simulated devices (seconds)')
+    parser.add_argument('--iterations', type=int, default=5, help='number of iterations of refresh, writes and dumps')
+    parser.add_argument('--duration', type=float, default=10.0, help='duration of the COV notifications benchmark (seconds)')
+    parser.add_argument('--changeInterval', type=float, default=1.0, help='interval of the simulated value changes (seconds)')
+    parser.add_argument('--output', type=str, help='JSON results file (default stdout)')
+    parser.add_argument('--simulate', action='store_true', help=argparse.SUPPRESS)
+    args=parser.parse_args()
+
+    if args.simulate:
+        simulate(args)
+        return
+
+    command=[sys.executable, os.path.abspath(__file__), '--simulate',
+             '--devices', str(args.devices), '--points', str(args.points), '--types', args.types,
+             '--latency', str(args.latency), '--changeInterval', str(args.changeInterval)]
+    simulator=subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True)
+    try:
+        if simulator.stdout.readline().strip()!='ready':
+            raise Exception('unable to start the simulated devices')
+
+        from digimat.bac0 import BAC
+        bacnet=BAC(network='127.0.0.1/24', deviceId=FIRST_DEVICE_ID-1)
+        try:
+            results=bench(bacnet, args)
+        finally:
+            bacnet.close()
+    finally:
+        simulator.stdin.close()
+        simulator.wait(10)
+
+    report={'version': str(bacnet.version),
+            'stamp': time.time(),
+            'config': {'devices': args.devices, 'points': args.points, 'types': args.types,
+                       'latency': args.latency, 'iterations': args.iterations, 'duration': args.duration},
+            'results': results}
+    data=json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(data)
+    else:
+        print(data)
+
+
+if __name__ == "__main__":
+    main()
@@ -16,3 +16,7 @@ from .bacdevice import BACDevice
 from .bacnet import BAC
 
 from .xmlremote import XMLRemoteCommand
+
+from .bacasync import AsyncBAC
+from .bacasync import AsyncBACDevice
+from .bacasync import AsyncBACPoint
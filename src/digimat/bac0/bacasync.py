@@ -0,0 +1,313 @@
+#!/bin/python
+
+import asyncio
+import concurrent.futures
+
+from bacpypes.iocb import IOCB
+from bacpypes.core import deferred
+from bacpypes.object import get_datatype
+from bacpypes.constructeddata import Array
+from bacpypes.primitivedata import Unsigned
+
+from .bacstream import BACChangeConsumer
+from .bacbatch import BACRequestError
+
+
+class AsyncBAC(object):
+    """asyncio facade of a BAC object. Reads and writes are sent natively (bacpypes IOCB completed from the BAC0 thread),
+    so an event loop may keep thousands of transactions in flight without a thread per caller. Other operations
+    (discover, refresh, cov, ...) are run on a small shared worker pool.
+
+    >>> abac=AsyncBAC(bacnet)
+    >>> value=await abac.device(8015).point('analogInput13064').read()
+    """
+    def __init__(self, bac, maxInFlight=256, workers=8):
+        # assert(isinstance(bac, BAC))
+        self._bac=bac
+        self._maxInFlight=max(1, int(maxInFlight))
+        self._semaphore=None
+        self._executor=concurrent.futures.ThreadPoolExecutor(max_workers=max(1, int(workers)))
+        self._devices={}
+
+    def __repr__(self):
+        return '<%s(%s)>' % (self.__class__.__name__, self._bac)
+
+    @property
+    def bac(self):
+        """reference to the synchronous BAC object (readonly)
+        """
+        return self._bac
+
+    @property
+    def logger(self):
+        return self._bac.logger
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    async def run(self, function, *args):
+        """run a blocking function on the worker pool"""
+        loop=asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, function, *args)
+
+    async def request(self, request, timeout=None):
+        """send a bacpypes confirmed request and return the response APDU"""
+        if self._semaphore is None:
+            self._semaphore=asyncio.Semaphore(self._maxInFlight)
+        loop=asyncio.get_running_loop()
+        future=loop.create_future()
+
+        def complete(iocb):
+            # called from the BAC0/bacpypes thread
+            def done():
+                if future.done():
+                    return
+                if iocb.ioError:
+                    future.set_exception(BACRequestError(iocb.ioError))
+                else:
+                    future.set_result(iocb.ioResponse)
+            loop.call_soon_threadsafe(done)
+
+        async with self._semaphore:
+            iocb=IOCB(request)
+            iocb.add_callback(complete)
+            deferred(self._bac.bac0.this_application.request_io, iocb)
+            try:
+                if timeout:
+                    return await asyncio.wait_for(future, timeout)
+                return await future
+            except (asyncio.CancelledError, asyncio.TimeoutError):
+                # don't leave the transaction in flight in the bacpypes application
+                deferred(iocb.abort, TimeoutError('request cancelled or timed out'))
+                raise
+
+    def _measure(self, address, service):
+        """return the context manager measuring a request to the device at the given address, through it's circuit
+        breaker if the device is declared (see BACDevice.measure())"""
+        did=self._bac.directory.getId(address)
+        device=self._bac.device(did) if did is not None else None
+        if device is not None:
+            return device.measure(service)
+        return self._bac.metrics.measure(did, service)
+
+    def _decode(self, apdu, vendorId=0):
+        datatype=get_datatype(apdu.objectIdentifier[0], apdu.propertyIdentifier, vendorId)
+        if not datatype:
+            raise TypeError('unknown datatype for %s' % str(apdu.propertyIdentifier))
+        if issubclass(datatype, Array) and apdu.propertyArrayIndex is not None:
+            if apdu.propertyArrayIndex==0:
+                return apdu.propertyValue.cast_out(Unsigned)
+            return apdu.propertyValue.cast_out(datatype.subtype)
+        return apdu.propertyValue.cast_out(datatype)
+
+    async def read(self, address, objectType, instance, prop='presentValue', index=None, timeout=None):
+        """read the property of an object on the device given by it's address"""
+        args=[str(address), str(objectType), str(int(instance)), str(prop)]
+        request=self._bac.bac0.build_rp_request(args, arr_index=index)
+        with self._measure(address, 'readProperty'):
+            apdu=await self.request(request, timeout)
+        return self._decode(apdu)
+
+    async def write(self, address, objectType, instance, prop, value, priority=None, timeout=None):
+        """write the property of an object on the device given by it's address ('null' relinquish the priority)"""
+        args=[str(address), str(objectType), str(int(instance)), str(prop), str(value)]
+        if priority:
+            args.extend(['-', str(int(priority))])
+        request=self._bac.bac0.build_wp_request(args)
+        with self._measure(address, 'writeProperty'):
+            await self.request(request, timeout)
+        return True
+
+    async def whois(self, network='*:*'):
+        return await self.run(self._bac.whois, network)
+
+    async def declareDevice(self, did, address=None, poll=15, lazy=False):
+        device=await self.run(lambda: self._bac.declareDevice(did, address, poll=poll, lazy=lazy))
+        if device is not None:
+            return self.device(device)
+
+    async def discover(self, network='*:*'):
+        """declare every device reported by a whois(network) and return the list of AsyncBACDevice"""
+        devices=await self.run(self._bac.discover, network)
+        return [self.device(device) for device in devices or []]
+
+    def device(self, did):
+        """return the AsyncBACDevice of any declared device from id, name, address, index (or BACDevice object)"""
+        device=did
+        if not hasattr(device, 'bac0device'):
+            device=self._bac.device(did)
+        if device is not None:
+            adevice=self._devices.get(device.did)
+            if adevice is None:
+                adevice=AsyncBACDevice(self, device)
+                self._devices[device.did]=adevice
+            return adevice
+
+    def devices(self):
+        return [self.device(device) for device in self._bac.devices()]
+
+    def __getitem__(self, key):
+        return self.device(key)
+
+
+class AsyncBACDevice(object):
+    """asyncio facade of a BACDevice (see AsyncBAC)"""
+    def __init__(self, parent, device):
+        self._parent=parent
+        self._device=device
+
+    def __repr__(self):
+        return '<%s(%s)>' % (self.__class__.__name__, self._device)
+
+    @property
+    def device(self):
+        """reference to the synchronous BACDevice object (readonly)
+        """
+        return self._device
+
+    @property
+    def did(self):
+        return self._device.did
+
+    @property
+    def address(self):
+        return self._device.address
+
+    async def read(self, objectType, instance, prop='presentValue', index=None, timeout=None):
+        return await self._parent.read(self._device.address, objectType, instance, prop, index, timeout)
+
+    async def write(self, objectType, instance, prop, value, priority=None, timeout=None):
+        return await self._parent.write(self._device.address, objectType, instance, prop, value, priority, timeout)
+
+    async def ping(self, timeout=3.0):
+        """return True if the device answers to an objectName read"""
+        try:
+            await self.read('device', self._device.did, 'objectName', timeout=timeout)
+            return True
+        except:
+            pass
+        return False
+
+    async def refresh(self, keys=None):
+        """refresh the device's points (batched ReadPropertyMultiple requests), return the number of requests sent"""
+        return await self._parent.run(self._device.refresh, keys)
+
+    async def subscribe(self, ttl=300):
+        """subscribe COV on every point of the device"""
+        return await self._parent.run(self._device.cov, ttl)
+
+    def point(self, key):
+        """return the AsyncBACPoint of the device's point given by index, name or descriptor (or BACPoint object)"""
+        point=key
+        if not hasattr(point, 'bac0point'):
+            point=self._device.points[key]
+        if point is not None:
+            return AsyncBACPoint(self, point)
+
+    def __getitem__(self, key):
+        return self.point(key)
+
+    def __iter__(self):
+        return iter([AsyncBACPoint(self, point) for point in self._device.points])
+
+
+class AsyncBACPoint(object):
+    """asyncio facade of a BACPoint (see AsyncBAC)"""
+    def __init__(self, parent, point):
+        self._parent=parent
+        self._point=point
+
+    def __repr__(self):
+        return '<%s(%s)>' % (self.__class__.__name__, self._point)
+
+    @property
+    def point(self):
+        """reference to the synchronous BACPoint object (readonly)
+        """
+        return self._point
+
+    @property
+    def value(self):
+        """last known value (no traffic)"""
+        return self._point.value
+
+    async def read(self, prop='presentValue', timeout=None):
+        """read (natively) a property of the point, updating the point's cached data"""
+        value=await self._parent.read(self._point.type, self._point.address, prop, timeout=timeout)
+        self._point._update({prop: value})
+        return value
+
+    async def write(self, value, prop='presentValue', priority=None, timeout=None):
+        """write (natively) a value to the point ('null' relinquish the given priority)"""
+        if value!='null':
+            value=self._point._normalizeValue(value)
+        try:
+            return await self._parent.write(self._point.type, self._point.address, prop, value, priority, timeout)
+        finally:
+            self._point.invalidatePriorityArray()
+
+    async def refresh(self):
+        """refresh the point (a single ReadPropertyMultiple request if supported by the device)"""
+        return await self._parent._parent.run(self._point.refresh)
+
+    async def subscribe(self, ttl=300):
+        return await self._parent._parent.run(self._point.cov, ttl)
+
+    async def unsubscribe(self):
+        return await self._parent._parent.run(self._point.covCancel)
+
+    async def changes(self, maxsize=1000):
+        """async iterator yielding (value, timestamp) for each value change of the point pushed to the BAC's change
+        stream by COV notifications (see subscribe()). Events are pushed to the event loop, nothing is polled"""
+        stream=self._parent._parent.bac.changeStream
+        consumer=AsyncBACChangeConsumer(stream, asyncio.get_running_loop(),
+            filter=lambda event: event.point is self._point, maxsize=maxsize)
+        stream.add(consumer)
+        try:
+            while True:
+                event=await consumer.aget()
+                if event is None:
+                    return
+                yield event.value, event.stamp
+        finally:
+            consumer.close()
+
+
+class AsyncBACChangeConsumer(BACChangeConsumer):
+    """BACChangeConsumer waking an asyncio event loop (call_soon_threadsafe) when an event is pushed by the BAC0 thread"""
+    def __init__(self, stream, loop, filter=None, maxsize=1000, overflow='dropOldest'):
+        super().__init__(stream, filter=filter, maxsize=maxsize, overflow=overflow, blockTimeout=0)
+        self._loop=loop
+        self._ready=asyncio.Event()
+
+    def _wakeup(self):
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            # event loop closed
+            pass
+
+    def put(self, event):
+        if super().put(event):
+            self._wakeup()
+            return True
+        return False
+
+    async def aget(self):
+        """return the next event, or None once the consumer is closed"""
+        while True:
+            event=self.get(0)
+            if event is not None:
+                return event
+            if self._closed:
+                return None
+            await self._ready.wait()
+            self._ready.clear()
+
+    def close(self):
+        super().close()
+        self._wakeup()
+
+
+if __name__ == "__main__":
+    pass
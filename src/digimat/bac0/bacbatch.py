@@ -0,0 +1,475 @@
+#!/bin/python
+
+import concurrent.futures
+
+from bacpypes.iocb import IOCB
+from bacpypes.core import deferred
+from bacpypes.apdu import RejectPDU, AbortReason, RejectReason
+
+from prettytable import PrettyTable
+
+
+def errorReason(error):
+    """return the reason of a failed request : the abort/reject reason or the error code of the response APDU
+    (bacpypes iocb.ioError), else the exception message"""
+    if error is TimeoutError or isinstance(error, TimeoutError):
+        return 'timeout'
+    reason=getattr(error, 'apduAbortRejectReason', None)
+    if reason is not None:
+        # bacpypes gives the reason as it's enumerated value (i.e. 65 for 'noResponse')
+        try:
+            if getattr(error, 'apduType', None)==RejectPDU.pduType:
+                return str(RejectReason(reason).value)
+            return str(AbortReason(reason).value)
+        except:
+            return str(reason)
+    errorCode=getattr(error, 'errorCode', None)
+    if errorCode is not None:
+        return str(errorCode)
+    errorType=getattr(error, 'errorType', None)
+    if errorType is not None:
+        # i.e. WritePropertyMultipleError
+        return str(getattr(errorType, 'errorCode', errorType))
+    return str(error) or error.__class__.__name__
+
+
+class BACRequestError(IOError):
+    """Failed confirmed request, keeping the error, reject or abort APDU (or the exception) given by bacpypes"""
+    def __init__(self, error):
+        self.error=error
+        super().__init__(errorReason(error))
+
+
+def isRejectedError(error):
+    """return True if the error means that the device doesn't understand the (multiple) service request"""
+    if getattr(getattr(error, 'error', error), 'apduType', None)==RejectPDU.pduType:
+        return True
+    reason=('%s %s' % (error.__class__.__name__, errorReason(error))).lower()
+    for text in ['unrecognizedservice', 'unrecognized service', 'reject', 'servicerequestdenied']:
+        if text in reason:
+            return True
+    return False
+
+
+def isTimeoutError(error):
+    """return True if the error means that the device didn't answer (or is quarantined, see BACCircuitBreaker).
+    Classified on the abort reason (i.e. 'noResponse') and not on the exception class, as BAC0 raises
+    NoResponseFromController for error and reject responses too"""
+    if 'timeout' in error.__class__.__name__.lower():
+        return True
+    reason=errorReason(error).lower()
+    if 'noresponse' in reason or 'timeout' in reason or 'unavailable' in reason:
+        return True
+    return False
+
+
+class BACBatchReader(object):
+    """Group the property reads of a device into ReadPropertyMultiple (RPM) requests sized to the device's max APDU.
+    Should be created from the BACDevice object, with something like device.batchReader()
+    """
+    # rough encoded sizes (bytes) used to estimate the size of a RPM response
+    APDU_HEADER_SIZE=16
+    OBJECT_SIZE=8
+    PROPERTY_SIZE=12
+    PROPERTY_SIZES={'priorityArray': 80, 'objectName': 40, 'description': 64,
+                    'activeText': 24, 'inactiveText': 24, 'stateText': 160, 'objectList': 480}
+    # number of segments we allow ourself to ask for, when the device supports segmentation
+    MAX_SEGMENTS=4
+
+    def __init__(self, device):
+        # assert(isinstance(device, BACDevice))
+        self._device=device
+        self._objects={}
+        self._points={}
+        self._results={}
+        self._requestCount=0
+
+    def __repr__(self):
+        return '<%s[%s](%d objects, %d requests)>' % (self.__class__.__name__, self._device.did,
+            len(self._objects), self._requestCount)
+
+    @property
+    def device(self):
+        return self._device
+
+    @property
+    def logger(self):
+        return self._device.logger
+
+    @property
+    def requestCount(self):
+        """number of requests sent to the device by the last read() (readonly)
+        """
+        return self._requestCount
+
+    def add(self, objectType, instance, props):
+        """register the properties (name or list of names) to be read on the object given by it's type and instance
+        """
+        if props:
+            if type(props) is not list:
+                props=[props]
+            key=(objectType, int(instance))
+            items=self._objects.setdefault(key, [])
+            for prop in props:
+                if prop not in items:
+                    items.append(prop)
+            return key
+
+    def addPoint(self, point, props=None):
+        """register a BACPoint, with the properties it needs to be refreshed (or the given props)
+        """
+        key=self.add(point.type, point.address, props or point.refreshProperties())
+        if key:
+            self._points[key]=point
+
+    def count(self):
+        return len(self._objects)
+
+    def __len__(self):
+        return self.count()
+
+    def maxRequestSize(self):
+        """return the estimated number of bytes a response may use (device's max APDU, multiplied when segmentation is supported)
+        """
+        size=self._device.maxApdu()
+        if self._device.isSegmentationSupported():
+            size*=self.MAX_SEGMENTS
+        return size-self.APDU_HEADER_SIZE
+
+    def estimateSize(self, props):
+        size=self.OBJECT_SIZE
+        for prop in props:
+            size+=self.PROPERTY_SIZES.get(prop, self.PROPERTY_SIZE)
+        return size
+
+    def chunks(self):
+        """return the registered objects split into lists of (key, props) fitting in one RPM request
+        """
+        chunks=[]
+        chunk=[]
+        size=0
+        maxsize=self.maxRequestSize()
+        for key, props in self._objects.items():
+            osize=self.estimateSize(props)
+            if chunk and size+osize>maxsize:
+                chunks.append(chunk)
+                chunk=[]
+                size=0
+            chunk.append((key, props))
+            size+=osize
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def _decode(self, props, items):
+        """decode the BAC0 readMultiple() results of one object into a {property: value} dict"""
+        values={}
+        if items:
+            position=0
+            for item in items:
+                if type(item) is tuple and len(item)==2 and item[0] in props:
+                    prop, value=item
+                    # BAC0 may return (value, prop) pairs when the property names are shown
+                    if type(value) is tuple and len(value)==2 and value[1]==prop:
+                        value=value[0]
+                else:
+                    if position>=len(props):
+                        break
+                    prop, value=props[position], item
+                position+=1
+                values[prop]=value
+        return values
+
+    def _readMultiple(self, chunk):
+        objects={}
+        for key, props in chunk:
+            objects['%s:%d' % key]=props
+        request={'address': self._device.address, 'objects': objects}
+        self._requestCount+=1
+        with self._device.measure('readPropertyMultiple'):
+            results=self._device.bac0.readMultiple(self._device.address, request_dict=request)
+        if results is None:
+            raise ValueError('no RPM response from device %d' % self._device.did)
+        for key, props in chunk:
+            self._results[key]=self._decode(props, results.get(key))
+
+    def _read(self, key, prop):
+        self._requestCount+=1
+        with self._device.measure('readProperty'):
+            return self._device.bac0.read('%s %s %d %s' % (self._device.address, key[0], key[1], prop))
+
+    def _readSingle(self, key, prop):
+        try:
+            value=self._device.singleFlight((key[0], key[1], prop, None), self._read, key, prop)
+            self._results.setdefault(key, {})[prop]=value
+        except:
+            self.logger.debug('unable to read %s%d.%s on device %d' % (key[0], key[1], prop, self._device.did))
+
+    def read(self):
+        """send the requests (RPM when supported, single reads otherwise), update registered points and
+        return a dict {(objectType, instance): {property: value}}
+        """
+        self._requestCount=0
+        self._results={}
+        for chunk in self.chunks():
+            if self._device.isRPMSupported() is not False:
+                try:
+                    self._readMultiple(chunk)
+                    self._device.setRPMSupported(True)
+                    continue
+                except Exception as e:
+                    if isRejectedError(e):
+                        self.logger.warning('device %d seems to reject RPM requests, using single reads' % self._device.did)
+                        self._device.setRPMSupported(False)
+                    elif isTimeoutError(e):
+                        # no need to retry each property on a device that doesn't answer
+                        self.logger.debug('RPM timeout on device %d' % self._device.did)
+                        continue
+                    else:
+                        self.logger.debug('RPM failed on device %d (%s), using single reads' % (self._device.did, e))
+
+            for key, props in chunk:
+                for prop in props:
+                    self._readSingle(key, prop)
+
+        for key, point in self._points.items():
+            values=self._results.get(key)
+            if values:
+                point._update(values)
+
+        self.logger.debug('%d objects read from device %d using %d requests' % (len(self._objects), self._device.did, self._requestCount))
+        return self._results
+
+
+class BACBatchWriter(object):
+    """Group the property writes of a device into WritePropertyMultiple (WPM) requests sized to the device's max APDU.
+    Devices rejecting WPM get pipelined single writes, with a bounded number of requests in flight.
+    Should be created from the BACDevice object, with something like device.batchWriter()
+    """
+    # rough encoded size (bytes) of a single property write in a WPM request
+    APDU_HEADER_SIZE=16
+    WRITE_SIZE=20
+    # WPM request timeout (seconds)
+    TIMEOUT=10
+
+    def __init__(self, device, window=4):
+        # assert(isinstance(device, BACDevice))
+        self._device=device
+        self._window=max(1, int(window))
+        self._writes=[]
+        self._results={}
+        self._requestCount=0
+
+    def __repr__(self):
+        return '<%s[%s](%d writes, %d requests)>' % (self.__class__.__name__, self._device.did,
+            len(self._writes), self._requestCount)
+
+    @property
+    def device(self):
+        return self._device
+
+    @property
+    def logger(self):
+        return self._device.logger
+
+    @property
+    def requestCount(self):
+        """number of requests sent to the device by the last write() (readonly)
+        """
+        return self._requestCount
+
+    def add(self, objectType, instance, prop, value, priority=None, key=None):
+        """register a write of value ('null' to relinquish) to the given object's property. The key (default to the
+        (objectType, instance, prop, priority) tuple) identifies the write in the results
+        """
+        if key is None:
+            key=(objectType, int(instance), prop, priority)
+        self._writes.append((key, objectType, int(instance), prop, value, priority))
+        return key
+
+    def count(self):
+        return len(self._writes)
+
+    def __len__(self):
+        return self.count()
+
+    def _arg(self, write):
+        """return the BAC0 argument string (without address) of a write"""
+        key, objectType, instance, prop, value, priority=write
+        if type(value) is bool:
+            value='active' if value else 'inactive'
+        arg='%s %d %s %s' % (objectType, instance, prop, str(value))
+        if priority:
+            arg+=' - %d' % int(priority)
+        return arg
+
+    def chunks(self):
+        maxsize=self._device.maxApdu()-self.APDU_HEADER_SIZE
+        size=max(1, int(maxsize/self.WRITE_SIZE))
+        return [self._writes[n:n+size] for n in range(0, len(self._writes), size)]
+
+    def _writePosition(self, chunk, reference):
+        """return the position in the chunk of the write given by a BACnet objectPropertyReference"""
+        try:
+            objectType, instance=reference.objectIdentifier
+            for position, write in enumerate(chunk):
+                if write[1]==str(objectType) and write[2]==int(instance) and write[3]==str(reference.propertyIdentifier):
+                    return position
+        except:
+            pass
+
+    def _writeMultiple(self, chunk):
+        """send a WPM request and return the writes that were not confirmed (to be retried with single writes)"""
+        self._requestCount+=1
+        bac0=self._device.bac0
+        request=bac0.build_wpm_request([self._arg(write) for write in chunk], addr=self._device.address)
+        try:
+            with self._device.measure('writePropertyMultiple'):
+                iocb=IOCB(request)
+                iocb.set_timeout(self.TIMEOUT)
+                deferred(bac0.this_application.request_io, iocb)
+                iocb.wait()
+                if iocb.ioError:
+                    raise BACRequestError(iocb.ioError)
+        except BACRequestError as e:
+            # the device stops at the first failed write : the previous ones are done, the next ones unknown
+            reference=getattr(e.error, 'firstFailedWriteAttempt', None)
+            position=self._writePosition(chunk, reference) if reference is not None else None
+            if position is None:
+                raise
+            for write in chunk[:position]:
+                self._results[write[0]]=True
+            self._results[chunk[position][0]]=e
+            return chunk[position+1:]
+
+        for write in chunk:
+            self._results[write[0]]=True
+        return []
+
+    def _writeSingle(self, write):
+        try:
+            with self._device.measure('writeProperty'):
+                self._device.bac0.write('%s %s' % (self._device.address, self._arg(write)))
+            return True
+        except Exception as e:
+            return e
+
+    def _writePipelined(self, writes):
+        """send single writes, with at most window requests in flight"""
+        if self._window==1:
+            for write in writes:
+                self._requestCount+=1
+                self._results[write[0]]=self._writeSingle(write)
+            return
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self._window) as executor:
+            futures={executor.submit(self._writeSingle, write): write for write in writes}
+            self._requestCount+=len(futures)
+            for future in concurrent.futures.as_completed(futures):
+                self._results[futures[future][0]]=future.result()
+
+    def write(self):
+        """send the writes (WPM when supported, pipelined single writes otherwise) and return a dict {key: result},
+        result being True for a successful write or the error"""
+        self._requestCount=0
+        self._results={}
+        for chunk in self.chunks():
+            if self._device.isWPMSupported() is not False:
+                try:
+                    chunk=self._writeMultiple(chunk)
+                    self._device.setWPMSupported(True)
+                    if not chunk:
+                        continue
+                except Exception as e:
+                    if isRejectedError(e) or isinstance(e, AttributeError):
+                        self.logger.warning('device %d seems to reject WPM requests, using single writes' % self._device.did)
+                        self._device.setWPMSupported(False)
+                    elif isTimeoutError(e):
+                        for write in chunk:
+                            self._results[write[0]]=e
+                        continue
+                    else:
+                        self.logger.debug('WPM failed on device %d (%s), using single writes' % (self._device.did, e))
+            self._writePipelined(chunk)
+
+        self.logger.debug('%d writes sent to device %d using %d requests' % (len(self._writes), self._device.did, self._requestCount))
+        return self._results
+
+
+class BACWriteReport(object):
+    """Per point results of a bulk write (see BACPointsBag.write()). A result is True for a successful write, or the error
+    """
+    def __init__(self):
+        self._results={}
+        self._values={}
+        self._unresolved={}
+        self._requestCount=0
+
+    def __repr__(self):
+        return '<%s(%d/%d succeeded, %d unresolved, %d requests)>' % (self.__class__.__name__,
+            len(self.succeeded()), len(self._results), len(self._unresolved), self._requestCount)
+
+    def set(self, point, value, result):
+        self._values[point]=value
+        self._results[point]=result
+
+    def setUnresolved(self, key, value):
+        """record a write whose key doesn't designate a point of the bag (not sent)"""
+        self._unresolved[key]=value
+
+    def unresolved(self):
+        """return the keys of the writes not matching any point"""
+        return list(self._unresolved)
+
+    def addRequests(self, count):
+        self._requestCount+=count
+
+    @property
+    def requestCount(self):
+        """number of requests sent (readonly)"""
+        return self._requestCount
+
+    def result(self, point):
+        return self._results.get(point)
+
+    def __getitem__(self, point):
+        return self.result(point)
+
+    def isSuccess(self):
+        """return True if every write succeeded"""
+        return len(self.failed())==0 and not self._unresolved
+
+    def succeeded(self):
+        return [point for point, result in self._results.items() if result is True]
+
+    def failed(self):
+        return [point for point, result in self._results.items() if result is not True]
+
+    def items(self):
+        return self._results.items()
+
+    def count(self):
+        return len(self._results)
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self._results)
+
+    def dump(self):
+        t=PrettyTable()
+        t.field_names=['name', 'descriptor', 'value', 'result']
+        t.align['name']='l'
+        t.align['descriptor']='l'
+        t.align['value']='r'
+        t.align['result']='l'
+        for point, result in self._results.items():
+            t.add_row([point.name, point.descriptor, str(self._values.get(point)),
+                       'OK' if result is True else str(result)])
+        for key, value in self._unresolved.items():
+            t.add_row([str(key), '?', str(value), 'unresolved'])
+        print(t)
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,249 @@
+#!/bin/python
+
+import time
+import threading
+
+from .bacbatch import isTimeoutError
+
+
+class BACDeviceUnavailableError(Exception):
+    """Raised (without any request sent) when a request is aimed to a device whose circuit breaker is open"""
+    pass
+
+
+class BACCircuitBreaker(object):
+    """Circuit breaker of a BACDevice. After failureThreshold consecutive timeouts, the circuit opens : requests to the
+    device fail fast (BACDeviceUnavailableError) and the device's polling, scheduler and COV work is paused. The device
+    is then probed with an exponential backoff (probeDelay doubled up to maxProbeDelay), a single request being let
+    through (half open). The circuit closes, and the device work resumes, as soon as the device answers again.
+    Should be used through the BACDevice object (device.breaker)
+    """
+    CLOSED='closed'
+    OPEN='open'
+    HALF_OPEN='halfOpen'
+
+    def __init__(self, device, failureThreshold=3, probeDelay=5.0, maxProbeDelay=300.0):
+        # assert(isinstance(device, BACDevice))
+        self._device=device
+        self._failureThreshold=max(1, int(failureThreshold))
+        self._probeDelay=float(probeDelay)
+        self._maxProbeDelay=float(maxProbeDelay)
+        self._state=self.CLOSED
+        self._failures=0
+        self._delay=self._probeDelay
+        self._nextProbe=0
+        self._openCount=0
+        self._lastSuccess=None
+        self._lock=threading.Lock()
+        self._timer=None
+
+    def __repr__(self):
+        return '<%s[%s](%s, %d failures)>' % (self.__class__.__name__, self._device.did, self._state, self._failures)
+
+    @property
+    def logger(self):
+        return self._device.logger
+
+    @property
+    def state(self):
+        return self._state
+
+    @property
+    def openCount(self):
+        """number of times the circuit has been opened (readonly)"""
+        return self._openCount
+
+    @property
+    def lastSuccess(self):
+        """timestamp of the last request answered by the device (readonly)"""
+        return self._lastSuccess
+
+    def isOpen(self):
+        """return True if requests to the device currently fail fast"""
+        return self._state!=self.CLOSED
+
+    def nextProbe(self):
+        """return the timestamp of the next probe (0 if the circuit is closed)"""
+        if self._state==self.CLOSED:
+            return 0
+        return self._nextProbe
+
+    def allow(self):
+        """return True if a request may be sent to the device (the first request after the probe delay being the probe)"""
+        with self._lock:
+            if self._state==self.CLOSED:
+                return True
+            if self._state==self.OPEN and time.time()>=self._nextProbe:
+                self._state=self.HALF_OPEN
+                return True
+            return False
+
+    def check(self):
+        """raise BACDeviceUnavailableError if no request may be sent to the device"""
+        if not self.allow():
+            raise BACDeviceUnavailableError('device %d unavailable (circuit open, next probe in %ds)' %
+                (self._device.did, max(0, self._nextProbe-time.time())))
+
+    def success(self):
+        with self._lock:
+            self._lastSuccess=time.time()
+            self._failures=0
+            if self._state==self.CLOSED:
+                return
+            self._state=self.CLOSED
+            self._delay=self._probeDelay
+            self._cancelTimer()
+        self.logger.info('device %d is responding again, resuming it' % self._device.did)
+        self._device._onAvailable()
+
+    def failure(self):
+        with self._lock:
+            self._failures+=1
+            if self._state==self.HALF_OPEN:
+                # probe failed, back off
+                self._delay=min(self._maxProbeDelay, self._delay*2.0)
+                self._open()
+                return
+            if self._state==self.OPEN or self._failures<self._failureThreshold:
+                return
+            self._delay=self._probeDelay
+            self._openCount+=1
+            self._open()
+        self.logger.warning('device %d is not responding (%d timeouts), pausing it' % (self._device.did, self._failures))
+        self._device._onUnavailable()
+
+    def record(self, error=None):
+        """update the breaker with the outcome of a request (an error response still means the device is alive)"""
+        if error is not None and isinstance(error, BACDeviceUnavailableError):
+            return
+        if error is not None and isTimeoutError(error):
+            self.failure()
+        else:
+            self.success()
+
+    def _open(self):
+        self._state=self.OPEN
+        self._nextProbe=time.time()+self._delay
+        # make sure the device is probed, even if nothing else sends requests to it
+        self._cancelTimer()
+        self._timer=threading.Timer(self._delay, self._probe)
+        self._timer.daemon=True
+        self._timer.start()
+
+    def _cancelTimer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer=None
+
+    def _probe(self):
+        with self._lock:
+            if self._state!=self.OPEN:
+                return
+            # the timer may fire slightly before the probe time
+            self._nextProbe=min(self._nextProbe, time.time())
+        self._device.probe()
+
+    def reset(self):
+        """force the circuit closed"""
+        self.success()
+
+
+class BACDeviceWatchdog(object):
+    """Liveness watchdog of the devices polled by BAC0 (declareDevice(poll=...)). The BAC0 polling doesn't report it's
+    timeouts : a device whose values (and requests) got no answer for staleFactor poll periods (at least minAge seconds)
+    is probed, feeding it's circuit breaker, so that a dead controller gets quarantined and it's polling paused.
+    Should be used through the BAC object (bacnet.watchdog)
+    """
+    def __init__(self, parent, interval=15.0, staleFactor=3.0, minAge=30.0, timeout=3.0):
+        # assert(isinstance(parent, BAC))
+        self._parent=parent
+        self._interval=float(interval)
+        self._staleFactor=float(staleFactor)
+        self._minAge=float(minAge)
+        self._timeout=timeout
+        self._probeCount=0
+        self._lock=threading.Lock()
+        self._thread=None
+        self._eventStop=threading.Event()
+
+    def __repr__(self):
+        return '<%s(%ds, %d probes)>' % (self.__class__.__name__, self._interval, self._probeCount)
+
+    @property
+    def logger(self):
+        return self._parent.logger
+
+    @property
+    def probeCount(self):
+        """number of probes sent (readonly)"""
+        return self._probeCount
+
+    def isStale(self, device, now=None):
+        """return True if the polled device didn't answer for too long"""
+        delay=device.pollDelay()
+        if not delay or not device.isAvailable():
+            # not polled by BAC0, or already handled by it's circuit breaker
+            return False
+        last=device.lastResponse()
+        if last is None:
+            return True
+        return (now or time.time())-last>max(self._minAge, self._staleFactor*delay)
+
+    def check(self):
+        """probe the stale polled devices. Return the number of probes sent"""
+        count=0
+        now=time.time()
+        for device in self._parent.devices():
+            try:
+                if self.isStale(device, now):
+                    self.logger.debug('device %d polled values are stale, probing it' % device.did)
+                    device.probe(self._timeout)
+                    count+=1
+            except:
+                self.logger.exception('unable to check device %d' % device.did)
+        self._probeCount+=count
+        return count
+
+    def _manager(self):
+        while not self._eventStop.wait(self._interval):
+            try:
+                self.check()
+            except:
+                self.logger.exception('watchdog error')
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._eventStop.clear()
+                self._thread=threading.Thread(target=self._manager, name='BACDeviceWatchdog', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._eventStop.set()
+
+
+class BACGuardedMeasure(object):
+    """Context manager of a device request : fail fast if the device's circuit breaker is open, measure the request
+    (see BACMetrics) and feed the breaker with it's outcome"""
+    __slots__=('_breaker', '_measure')
+
+    def __init__(self, breaker, measure):
+        self._breaker=breaker
+        self._measure=measure
+
+    def __enter__(self):
+        self._breaker.check()
+        self._measure.__enter__()
+        return self
+
+    def __exit__(self, etype, error, traceback):
+        self._measure.__exit__(etype, error, traceback)
+        if etype is not None and not issubclass(etype, Exception):
+            # cancelled (asyncio) or interrupted request, the device's state is unknown
+            return False
+        self._breaker.record(error)
+        return False
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,121 @@
+#!/bin/python
+
+import os
+import json
+import time
+import threading
+
+
+class BACDeviceCache(object):
+    """Persistent (on disk) cache of the object list and static point metadata of the devices, keyed by device id
+    and invalidated by the device's databaseRevision. Should be used through the BAC object (bacnet.cache)
+    """
+    # static properties of the BAC0 points stored in the cache
+    POINT_PROPERTIES=['name', 'description', 'units_state']
+    # static properties of the device stored in the cache
+    DEVICE_PROPERTIES=['objectName', 'vendorName', 'vendorIdentifier', 'modelName', 'description',
+                       'maxApduLengthAccepted', 'segmentationSupported']
+
+    def __init__(self, path):
+        self._path=os.path.expanduser(path)
+        self._lock=threading.Lock()
+        try:
+            os.makedirs(self._path, exist_ok=True)
+        except:
+            pass
+
+    def __repr__(self):
+        return '<%s(%s)>' % (self.__class__.__name__, self._path)
+
+    @property
+    def path(self):
+        return self._path
+
+    @staticmethod
+    def serializable(value):
+        """return the value as a json serializable object (or None)"""
+        if value is None or type(value) in (str, int, float, bool):
+            return value
+        if type(value) in (list, tuple):
+            return [BACDeviceCache.serializable(item) for item in value]
+        try:
+            return str(value)
+        except:
+            pass
+
+    def fname(self, did):
+        return os.path.join(self._path, 'device-%d.json' % int(did))
+
+    def load(self, did, databaseRevision):
+        """return the cached data of the device, or None if missing or outdated (databaseRevision changed).
+        An unknown databaseRevision (None, i.e. read failed) never validates an entry
+        """
+        if databaseRevision is None:
+            return None
+        try:
+            with self._lock:
+                with open(self.fname(did), 'r', encoding='utf-8') as f:
+                    data=json.load(f)
+            if data.get('databaseRevision')!=databaseRevision:
+                return None
+            return data
+        except:
+            pass
+
+    def store(self, did, address, databaseRevision, objectList, points, properties=None):
+        """save the device's objectList [(type, instance), ...], the static properties of it's points
+        {descriptor: {property: value}} and the static device properties. Nothing is stored if the databaseRevision
+        is unknown (None), keeping the existing entry
+        """
+        if databaseRevision is None:
+            return
+        try:
+            data={'did': int(did), 'address': str(address),
+                  'databaseRevision': databaseRevision,
+                  'stamp': time.time(),
+                  'objectList': [[str(item[0]), int(item[1])] for item in objectList],
+                  'points': {},
+                  'properties': {}}
+            if points:
+                for descriptor, values in points.items():
+                    data['points'][descriptor]={name: self.serializable(value) for name, value in values.items()}
+            if properties:
+                data['properties']={name: self.serializable(value) for name, value in properties.items()}
+            fname=self.fname(did)
+            tmp=fname+'.tmp'
+            with self._lock:
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(data, f)
+                os.replace(tmp, fname)
+            return True
+        except:
+            pass
+        return False
+
+    def invalidate(self, did):
+        try:
+            with self._lock:
+                os.remove(self.fname(did))
+        except:
+            pass
+
+    def clear(self):
+        """remove every cached device"""
+        try:
+            for fname in os.listdir(self._path):
+                if fname.startswith('device-') and fname.endswith('.json'):
+                    os.remove(os.path.join(self._path, fname))
+        except:
+            pass
+
+    @staticmethod
+    def objectList(data):
+        """return the objectList of cached data in the BAC0 expected format [(type, instance), ...]"""
+        try:
+            return [(item[0], item[1]) for item in data['objectList']]
+        except:
+            pass
+
+
+if __name__ == "__main__":
+    pass
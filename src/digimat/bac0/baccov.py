@@ -0,0 +1,267 @@
+#!/bin/python
+
+import time
+import heapq
+import random
+import threading
+import collections
+
+
+class BACCOVSubscription(object):
+    """A COV subscription of a point, with it's expiration and next renewal times"""
+    def __init__(self, point, lifetime):
+        self._point=point
+        self._lifetime=int(lifetime)
+        self._expiry=0
+        self._renewAt=0
+        self._renewCount=0
+
+    def __repr__(self):
+        return '<%s(%s, renew in %ds)>' % (self.__class__.__name__, self._point.descriptor, self._renewAt-time.time())
+
+    @property
+    def point(self):
+        return self._point
+
+    @property
+    def lifetime(self):
+        return self._lifetime
+
+    @property
+    def expiry(self):
+        return self._expiry
+
+    @property
+    def renewAt(self):
+        return self._renewAt
+
+    @property
+    def renewCount(self):
+        return self._renewCount
+
+
+class BACCOVManager(object):
+    """COV subscriptions manager of a BAC object. Each subscription is renewed ahead of it's expiration (with jitter),
+    renewals of points subscribed together being spread over time instead of hitting the device in a burst.
+    Points exceeding the per device subscriptions budget (or refused by the device) are polled instead, by the BAC's
+    poll scheduler (batched reads) with the given rateClass.
+    Should be used through the BAC object (bacnet.covManager)
+    """
+    def __init__(self, parent, maxSubscriptionsPerDevice=64, renewMargin=0.2, spread=0.3, jitter=0.05, rateClass='slow'):
+        # assert(isinstance(parent, BAC))
+        self._parent=parent
+        self._maxSubscriptionsPerDevice=int(maxSubscriptionsPerDevice)
+        self._deviceLimits={}
+        # renew when (1-renewMargin) of the lifetime is elapsed, first renewals being spread over spread*lifetime
+        self._renewMargin=renewMargin
+        self._spread=spread
+        self._jitter=jitter
+        self._rateClass=rateClass
+        self._subscriptions={}
+        # number of subscriptions per device id
+        self._deviceCounts=collections.Counter()
+        self._polled={}
+        self._queue=[]
+        self._sequence=0
+        self._lock=threading.Condition()
+        self._thread=None
+        self._eventStop=threading.Event()
+
+    def __repr__(self):
+        return '<%s(%d subscriptions, %d polled)>' % (self.__class__.__name__,
+            len(self._subscriptions), len(self._polled))
+
+    @property
+    def logger(self):
+        return self._parent.logger
+
+    def setDeviceLimit(self, did, limit):
+        """set the max number of COV subscriptions the device given by it's id will be asked to hold"""
+        self._deviceLimits[int(did)]=int(limit)
+
+    def deviceLimit(self, did):
+        return self._deviceLimits.get(int(did), self._maxSubscriptionsPerDevice)
+
+    def deviceCount(self, did):
+        """return the number of active subscriptions on the device"""
+        return self._deviceCounts[int(did)]
+
+    def _addSubscription(self, subscription):
+        self._subscriptions[subscription.point]=subscription
+        self._deviceCounts[subscription.point.device.did]+=1
+
+    def _removeSubscription(self, point):
+        subscription=self._subscriptions.pop(point, None)
+        if subscription is not None:
+            did=point.device.did
+            self._deviceCounts[did]-=1
+            if self._deviceCounts[did]<=0:
+                del self._deviceCounts[did]
+        return subscription
+
+    def subscriptions(self):
+        with self._lock:
+            return list(self._subscriptions.values())
+
+    def polledPoints(self):
+        """return the points polled because they could not be subscribed"""
+        with self._lock:
+            return list(self._polled.keys())
+
+    def isSubscribed(self, point):
+        return point in self._subscriptions
+
+    def _schedule(self, subscription, delay):
+        subscription._renewAt=time.time()+max(1.0, delay)
+        self._sequence+=1
+        heapq.heappush(self._queue, (subscription._renewAt, self._sequence, subscription))
+        self._lock.notify()
+
+    def _renewDelay(self, lifetime):
+        delay=lifetime*(1.0-self._renewMargin)
+        return delay-random.uniform(0, self._jitter*lifetime)
+
+    def _poll(self, point):
+        try:
+            self._parent.scheduler.add(point, self._rateClass)
+            self._polled[point]=self._rateClass
+        except:
+            pass
+
+    def subscribe(self, points, lifetime=300):
+        """subscribe COV on the given point (or list of points), renewing the subscriptions until unsubscribe().
+        Return the number of points subscribed (the other ones being polled)"""
+        if type(points) is not list:
+            points=[points]
+        lifetime=max(60, int(lifetime))
+        count=0
+        accepted=[]
+        with self._lock:
+            planned=collections.Counter()
+            for point in points:
+                if point in self._subscriptions:
+                    count+=1
+                    continue
+                did=point.device.did
+                if self.deviceCount(did)+planned[did]>=self.deviceLimit(did):
+                    self.logger.warning('COV budget of device %d reached, polling %s instead' % (did, point.descriptor))
+                    self._poll(point)
+                    continue
+                planned[did]+=1
+                accepted.append(point)
+
+        for n, point in enumerate(accepted):
+            with self._lock:
+                if not point.device.isAvailable():
+                    # quarantined device (circuit breaker open), subscribed by the manager once it answers again
+                    subscription=BACCOVSubscription(point, lifetime)
+                    self._addSubscription(subscription)
+                    self._schedule(subscription, point.device.breaker.nextProbe()-time.time())
+                    count+=1
+                    continue
+            try:
+                point.cov(lifetime)
+            except:
+                self.logger.warning('unable to subscribe COV on %s, polling it instead' % point.descriptor)
+                with self._lock:
+                    self._poll(point)
+                continue
+
+            with self._lock:
+                subscription=BACCOVSubscription(point, lifetime)
+                subscription._expiry=time.time()+lifetime
+                self._addSubscription(subscription)
+                if self._polled.pop(point, None):
+                    self._parent.scheduler.remove(point)
+                # spread the first renewals of points subscribed together
+                offset=self._spread*lifetime*n/len(accepted)
+                self._schedule(subscription, self._renewDelay(lifetime)-offset)
+                count+=1
+        self.start()
+        return count
+
+    def unsubscribe(self, points):
+        """cancel the COV subscription (or the fallback polling) of the given point (or list of points)"""
+        if type(points) is not list:
+            points=[points]
+        for point in points:
+            with self._lock:
+                subscription=self._removeSubscription(point)
+                polled=self._polled.pop(point, None)
+            try:
+                if subscription:
+                    point.covCancel()
+                if polled:
+                    self._parent.scheduler.remove(point)
+            except:
+                pass
+
+    def unsubscribeDevice(self, device):
+        self.unsubscribe([s.point for s in self.subscriptions() if s.point.device is device])
+        self.unsubscribe([p for p in self.polledPoints() if p.device is device])
+
+    def _pauseRenew(self, subscription):
+        """return True if the subscription's device is quarantined (circuit breaker open), the renewal being
+        rescheduled after the device's next probe"""
+        device=subscription.point.device
+        if device.isAvailable():
+            return False
+        with self._lock:
+            if self._subscriptions.get(subscription.point) is subscription:
+                self._schedule(subscription, device.breaker.nextProbe()-time.time())
+        return True
+
+    def _renew(self, subscription):
+        point=subscription.point
+        if self._pauseRenew(subscription):
+            return
+        try:
+            point.cov(subscription.lifetime)
+            with self._lock:
+                subscription._expiry=time.time()+subscription.lifetime
+                subscription._renewCount+=1
+                self._schedule(subscription, self._renewDelay(subscription.lifetime))
+        except:
+            if self._pauseRenew(subscription):
+                return
+            self.logger.warning('unable to renew COV on %s, polling it instead' % point.descriptor)
+            with self._lock:
+                self._removeSubscription(point)
+                self._poll(point)
+
+    def _manager(self):
+        while not self._eventStop.is_set():
+            subscription=None
+            with self._lock:
+                while self._queue:
+                    renewAt, sequence, item=self._queue[0]
+                    if self._subscriptions.get(item.point) is not item or renewAt!=item.renewAt:
+                        # cancelled or rescheduled
+                        heapq.heappop(self._queue)
+                        continue
+                    break
+                delay=60.0
+                if self._queue:
+                    delay=self._queue[0][0]-time.time()
+                    if delay<=0:
+                        subscription=heapq.heappop(self._queue)[2]
+                if subscription is None:
+                    self._lock.wait(min(max(delay, 0.1), 60.0))
+                    continue
+            self._renew(subscription)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._eventStop.clear()
+                self._thread=threading.Thread(target=self._manager, name='BACCOVManager', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._eventStop.set()
+        with self._lock:
+            self._lock.notify()
+
+
+if __name__ == "__main__":
+    pass
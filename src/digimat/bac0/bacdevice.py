@@ -1,4 +1,7 @@
 #!/bin/python
+import threading
+import time
+
 import BAC0
 
 from prettytable import PrettyTable
@@ -16,17 +19,49 @@ from .bacpoint import BACPointMultiStateValue
 
 from .bacpoints import BACPoints
 from .bacpoints import BACPointsBag
+from .bacpoints import BACLazyPoints
+
+from .bacbatch import BACBatchReader
+from .bacbatch import BACBatchWriter
+from .baccache import BACDeviceCache
+from .bachealth import BACDeviceHealth
+from .bacbreaker import BACCircuitBreaker
+from .bacbreaker import BACGuardedMeasure
 
 
 class BACDevice(object):
     """Represent a remote BACnet device. Should be created from the BAC object, with something like bacnet.declareObject(...)
     """
-    def __init__(self, parent, did, address, index=0, poll=15, filterOutOfService=False, objectList=None):
+    # object types exposed as BACPoint objects
+    POINT_TYPES=['analogInput', 'analogOutput', 'analogValue',
+                 'binaryInput', 'binaryOutput', 'binaryValue',
+                 'multiStateInput', 'multiStateOutput', 'multiStateValue']
+    # device object properties read together (a single ReadPropertyMultiple) on a cache miss
+    DEVICE_PROPERTIES=BACDeviceCache.DEVICE_PROPERTIES+['systemStatus', 'databaseRevision']
+    # max age (seconds) of the cached device properties (None: never expires)
+    PROPERTY_MAX_AGE={'systemStatus': 10, 'databaseRevision': 60}
+
+    def __init__(self, parent, did, address, index=0, poll=15, filterOutOfService=False, objectList=None, metadata=None, lazy=False):
         # assert(isinstance(parent, BAC))
         self._parent=parent
         self._did=int(did)
         self._address=address
         self._index=index
+        self._rpmSupported=None
+        self._wpmSupported=None
+        # device properties cache {name: (value, timestamp)}
+        self._properties={}
+        self._health=BACDeviceHealth()
+        self._breaker=BACCircuitBreaker(self)
+        # BAC0 polling delay paused while the device is unavailable
+        self._pausedPollDelay=None
+        # static metadata (objectList, points and device properties) loaded from the BAC's BACDeviceCache
+        self._metadata=metadata or {}
+        self._lazy=bool(lazy)
+        self._lazyLock=threading.RLock()
+        self._lazyNames=None
+        # objectList of a device created from the device cache (BAC0 only knowing the device object)
+        self._objectList=None
         self.logger.info('Creating device %s:%d' % (address, did))
         # FIXME: By default, BAC0 will read the object list from the controller
         # and define every points found inside the device as points.
@@ -36,9 +71,22 @@ class BACDevice(object):
         # Real problem for slow devices !!!
         # objects=[('analogValue', 9)]
         # This can take some time on slow devices (i.e. MSTP) with a lot of points
-        self._bac0device=BAC0.device(address, did, parent.bac0, poll=poll, history_size=None, object_list=objectList)
-        self._points=BACPoints()
-        self._loadDevicePoints(filterOutOfService)
+        if self._lazy:
+            # lazy mode : only point descriptors are recorded, BAC0 points are created on first access
+            descriptors=objectList or BACDeviceCache.objectList(self._metadata) or parent.retrieveDeviceObjectList(did, address) or []
+            descriptors=[(str(item[0]), int(item[1])) for item in descriptors if str(item[0]) in self.POINT_TYPES]
+            self._bac0device=BAC0.device(address, did, parent.bac0, poll=poll, history_size=None, object_list=[('device', self._did)])
+            self._points=BACLazyPoints(self, descriptors)
+        elif self._metadata.get('points'):
+            # warm start : points are created from the cached metadata, BAC0 reading nothing but the device object
+            self._objectList=[(str(item[0]), int(item[1])) for item in objectList or BACDeviceCache.objectList(self._metadata) or []]
+            self._bac0device=BAC0.device(address, did, parent.bac0, poll=poll, history_size=None, object_list=[('device', self._did)])
+            self._points=BACPoints()
+            self._loadCachedPoints()
+        else:
+            self._bac0device=BAC0.device(address, did, parent.bac0, poll=poll, history_size=None, object_list=objectList)
+            self._points=BACPoints()
+            self._loadDevicePoints(filterOutOfService)
 
     def __repr__(self):
         return '<%s:%d:%s(%s:%s), %d points)>' % (self.__class__.__name__,
@@ -51,36 +99,165 @@ class BACDevice(object):
             if filterOutOfService and bac0point.bacnet_properties['outOfService']:
                 continue
 
-            ptype=bac0point.properties.type
-            if ptype=='binaryInput':
-                point=BACPointBinaryInput(self, bac0point)
-            elif ptype=='binaryOutput':
-                point=BACPointBinaryOutput(self, bac0point)
-            elif ptype=='analogInput':
-                point=BACPointAnalogInput(self, bac0point)
-            elif ptype=='analogOutput':
-                point=BACPointAnalogOutput(self, bac0point)
-            elif ptype=='binaryValue':
-                point=BACPointBinaryValue(self, bac0point)
-            elif ptype=='analogValue':
-                point=BACPointAnalogValue(self, bac0point)
-            elif ptype=='multiStateInput':
-                point=BACPointMultiStateInput(self, bac0point)
-            elif ptype=='multiStateOutput':
-                point=BACPointMultiStateOutput(self, bac0point)
-            elif ptype=='multiStateValue':
-                point=BACPointMultiStateValue(self, bac0point)
-            else:
-                self.logger.warning('unable to match a specific BACPoint() class for type %s' % ptype)
-                point=BACPoint(self, bac0point)
-
             # if BACPoint is already existing, it will not be added
-            self._points.add(point)
+            self._points.add(self._createPoint(bac0point))
+
+    def _loadCachedPoints(self):
+        """create the points of the cached objectList from the cached metadata (without any read). Points missing
+        from the metadata (i.e. filtered out of service when the cache entry was stored) are not created"""
+        points=self._metadata.get('points', {})
+        for objectType, instance in self._objectList:
+            if objectType in self.POINT_TYPES and '%s%d' % (objectType, instance) in points:
+                bac0point=self._createBAC0Point(objectType, instance)
+                if bac0point is not None:
+                    self._points.add(self._createPoint(bac0point))
+
+    def _createPoint(self, bac0point):
+        """return the BACPoint object wrapping the given BAC0 point"""
+        ptype=bac0point.properties.type
+        if ptype=='binaryInput':
+            point=BACPointBinaryInput(self, bac0point)
+        elif ptype=='binaryOutput':
+            point=BACPointBinaryOutput(self, bac0point)
+        elif ptype=='analogInput':
+            point=BACPointAnalogInput(self, bac0point)
+        elif ptype=='analogOutput':
+            point=BACPointAnalogOutput(self, bac0point)
+        elif ptype=='binaryValue':
+            point=BACPointBinaryValue(self, bac0point)
+        elif ptype=='analogValue':
+            point=BACPointAnalogValue(self, bac0point)
+        elif ptype=='multiStateInput':
+            point=BACPointMultiStateInput(self, bac0point)
+        elif ptype=='multiStateOutput':
+            point=BACPointMultiStateOutput(self, bac0point)
+        elif ptype=='multiStateValue':
+            point=BACPointMultiStateValue(self, bac0point)
+        else:
+            self.logger.warning('unable to match a specific BACPoint() class for type %s' % ptype)
+            point=BACPoint(self, bac0point)
+        return point
+
+    def isLazy(self):
+        """return True if the device points are created on first access (lazy mode)
+        """
+        return self._lazy
+
+    def _stateTexts(self, value):
+        """return a bacpypes array of texts as a python list"""
+        try:
+            return [str(text) for text in value.value[1:]]
+        except:
+            pass
+        try:
+            return [str(text) for text in value]
+        except:
+            pass
+
+    def _readStaticProperties(self, objectType, instance):
+        """return the static properties of a point {name, description, units_state}, from the device cache
+        or with a single (RPM) read
+        """
+        descriptor='%s%d' % (objectType, instance)
+        data=self._metadata.get('points', {}).get(descriptor)
+        if data:
+            return data, None
+
+        props=['objectName', 'description', 'presentValue']
+        if objectType.startswith('analog'):
+            props.append('units')
+        elif objectType.startswith('binary'):
+            props.extend(['inactiveText', 'activeText'])
+        elif objectType.startswith('multiState'):
+            props.append('stateText')
+
+        reader=self.batchReader()
+        reader.add(objectType, instance, props)
+        values=reader.read().get((objectType, instance), {})
+        data={'name': values.get('objectName'), 'description': values.get('description')}
+        if objectType.startswith('analog'):
+            data['units_state']=values.get('units')
+        elif objectType.startswith('binary'):
+            data['units_state']=[values.get('inactiveText'), values.get('activeText')]
+        elif objectType.startswith('multiState'):
+            data['units_state']=self._stateTexts(values.get('stateText'))
+        return data, values.get('presentValue')
+
+    def _createBAC0Point(self, objectType, instance):
+        """create a BAC0 point (without any read if the device has been loaded from the device cache)"""
+        from BAC0.core.devices.Points import NumericPoint, BooleanPoint, EnumPoint
+
+        data, value=self._readStaticProperties(objectType, instance)
+        if not data.get('name'):
+            return None
+
+        pclass=NumericPoint
+        if objectType.startswith('binary'):
+            pclass=BooleanPoint
+        elif objectType.startswith('multiState'):
+            pclass=EnumPoint
+
+        bac0point=pclass(pointType=objectType, pointAddress=instance,
+                         pointName=data.get('name'), description=data.get('description') or '',
+                         presentValue=value, units_state=data.get('units_state'),
+                         device=self._bac0device)
+        try:
+            # let BAC0 poll the point with the device
+            self._bac0device.points.append(bac0point)
+        except:
+            pass
+        return bac0point
+
+    def _materializePoint(self, objectType, instance):
+        """create (lazy mode) and return the BACPoint of the given object"""
+        with self._lazyLock:
+            descriptor='%s%d' % (objectType, instance)
+            point=BACPoints.getByDescriptor(self._points, descriptor)
+            if point is None:
+                try:
+                    bac0point=self._createBAC0Point(objectType, instance)
+                    if bac0point is not None:
+                        point=self._createPoint(bac0point)
+                        self._points.add(point)
+                except:
+                    self.logger.exception('unable to create point %s on device %d' % (descriptor, self._did))
+            return point
+
+    def _lazyDescriptorFromName(self, name):
+        """return the descriptor of the (not yet created) point given by it's name (lazy mode)"""
+        with self._lazyLock:
+            if self._lazyNames is None:
+                names={}
+                points=self._metadata.get('points', {})
+                descriptors=self._points.descriptors()
+                missing=[]
+                for objectType, instance in descriptors:
+                    descriptor='%s%d' % (objectType, instance)
+                    try:
+                        names[points[descriptor]['name']]=descriptor
+                    except:
+                        missing.append((objectType, instance))
+                if missing:
+                    # names of the points not found in the cache, with batched objectName reads
+                    reader=self.batchReader()
+                    for objectType, instance in missing:
+                        reader.add(objectType, instance, 'objectName')
+                    for key, values in reader.read().items():
+                        if values.get('objectName'):
+                            names[str(values['objectName'])]='%s%d' % key
+                self._lazyNames=names
+            return self._lazyNames.get(name)
 
     @property
     def logger(self):
         return self._parent.logger
 
+    @property
+    def parent(self):
+        """reference to the BAC parent object (readonly)
+        """
+        return self._parent
+
     @property
     def bac0(self):
         """reference to the BAC0 main object (readonly)
@@ -106,24 +283,156 @@ class BACDevice(object):
         except:
             pass
 
-    def getProperty(self, name, update=False):
-        """return the requested bacnet property value (with a pre-read if update if True)
+    def propertyMaxAge(self, name):
+        """return the max age (seconds) of the cached value of the device property (None: never expires)"""
+        return self.PROPERTY_MAX_AGE.get(name)
+
+    def _cachedPropertyEntry(self, name):
+        """return the cached (value, timestamp) of the device property. Static properties are first taken from
+        the ones already read by BAC0 or from the device cache (no traffic)"""
+        entry=self._properties.get(name)
+        if entry is None and self.propertyMaxAge(name) is None:
+            value=None
+            try:
+                # using .bacnet_properties object property implies a refresh with BAC0
+                value=self._bac0device._bacnet_properties(False)[name]
+            except:
+                pass
+            if value is None:
+                value=self._metadata.get('properties', {}).get(name)
+            if value is not None:
+                entry=(value, time.time())
+                self._properties[name]=entry
+        return entry
+
+    def _readDeviceProperties(self, names):
+        reader=self.batchReader()
+        reader.add('device', self._did, names)
+        values=reader.read().get(('device', self._did), {})
+        now=time.time()
+        for name, value in values.items():
+            if value is not None:
+                self._properties[name]=(value, now)
+        return values
+
+    def fillProperties(self, names=None):
+        """read the device properties (default DEVICE_PROPERTIES) with a single ReadPropertyMultiple request on
+        the device object and update the properties cache. Return a {name: value} dict"""
+        names=list(names or self.DEVICE_PROPERTIES)
+        # never the key of a single property read (i.e. the batch reader's fallback), a flight can't wait for itself
+        key=('device', self._did, 'fill:'+','.join(names), None)
+        return self.singleFlight(key, self._readDeviceProperties, names)
+
+    def staleProperties(self):
+        """return the DEVICE_PROPERTIES missing from the properties cache or older than their max age"""
+        now=time.time()
+        names=[]
+        for name in self.DEVICE_PROPERTIES:
+            entry=self._cachedPropertyEntry(name)
+            maxAge=self.propertyMaxAge(name)
+            if entry is None or (maxAge is not None and now-entry[1]>maxAge):
+                names.append(name)
+        return names
+
+    def invalidateProperties(self, names=None):
+        """forget the cached value of the given device properties (default all), read again on next access"""
+        if names is None:
+            self._properties={}
+        else:
+            if type(names) is not list:
+                names=[names]
+            for name in names:
+                self._properties.pop(name, None)
+
+    def getProperty(self, name, update=False, maxAge=None):
+        """return the requested bacnet property value, from the properties cache if not older than maxAge
+        (default propertyMaxAge(name)), or read again (forced if update is True). A cache miss on one of the
+        DEVICE_PROPERTIES also reads the other missing or expired ones in the same request (all of them for a cold device)
         """
         try:
-            # using .bacnet_properties object property implies a refresh with BAC0
-            # value=self._bac0device.bacnet_properties[name].
-            value=self._bac0device._bacnet_properties(False)[name]
-            if update or value is None:
-                # print("DEBUG:REFRESH", name)
-                value=self._bac0device._bacnet_properties(True)[name]
+            entry=self._cachedPropertyEntry(name)
+            if not update and entry is not None:
+                if maxAge is None:
+                    maxAge=self.propertyMaxAge(name)
+                if maxAge is None or time.time()-entry[1]<=maxAge:
+                    return entry[0]
+            if name in self.DEVICE_PROPERTIES:
+                stale=self.staleProperties()
+                values=self.fillProperties([n for n in self.DEVICE_PROPERTIES if n==name or n in stale])
+            else:
+                values=self.fillProperties([name])
+            value=values.get(name)
+            if value is None and entry is not None:
+                # no answer, better return the last known value
+                return entry[0]
             return value
         except:
             pass
 
+    def cachedProperty(self, name):
+        """return the last known value of the bacnet property (or it's device cache value), or None (no traffic)
+        """
+        try:
+            entry=self._cachedPropertyEntry(name)
+            if entry is not None:
+                return entry[0]
+        except:
+            pass
+
+    def staticProperty(self, descriptor, name):
+        """return the static property of the given point descriptor as loaded from the device cache (no traffic)
+        """
+        try:
+            return self._metadata['points'][descriptor][name]
+        except:
+            pass
+
+    def isCached(self):
+        """return True if the device has been created from the device cache
+        """
+        if self._metadata:
+            return True
+        return False
+
+    def objectList(self):
+        """return the objectList [(type, instance), ...] of the device as known by BAC0, or by the device cache (no traffic)
+        """
+        if self._objectList is not None:
+            return list(self._objectList)
+        try:
+            return [(item[0], int(item[1])) for item in self._bac0device.properties.objects_list]
+        except:
+            pass
+        return [(point.type, point.address) for point in self.points]
+
+    def cacheData(self):
+        """return the (objectList, points, properties) static data to be saved in a device cache (no traffic)
+        """
+        points={}
+        objectList=self.objectList()
+        if self._lazy:
+            objectList=self._points.descriptors()
+            points.update(self._metadata.get('points', {}))
+        for point in self.points:
+            try:
+                values={}
+                for name in BACDeviceCache.POINT_PROPERTIES:
+                    values[name]=getattr(point.properties, name, None)
+                points[point.descriptor]=values
+            except:
+                pass
+        properties={}
+        for name in BACDeviceCache.DEVICE_PROPERTIES:
+            value=self.cachedProperty(name)
+            if value is not None:
+                properties[name]=value
+        return objectList, points, properties
+
     def updateProperties(self):
         """force a re-read of the properties of this device (will generate bacnet traffic)
         """
-        self._bac0device.update_bacnet_properties()
+        self.invalidateProperties()
+        self.fillProperties()
 
     @property
     def name(self):
@@ -136,11 +445,17 @@ class BACDevice(object):
         """
         return self._index
 
+    @property
+    def databaseRevision(self):
+        """return the actual databaseRevision of the device (will send a read to the device)
+        """
+        return self.getProperty('databaseRevision', True)
+
     @property
     def systemStatus(self):
-        """return the actual device status of the device (will send a systemStatus property read to the device)
+        """return the actual device status of the device (read again if the cached value is older than 10s)
         """
-        return self.getProperty('systemStatus', True)
+        return self.getProperty('systemStatus')
 
     @property
     def vendorName(self):
@@ -171,6 +486,53 @@ class BACDevice(object):
         """
         return self._bac0device.segmentation_supported
 
+    def maxApdu(self):
+        """return the max APDU length accepted by the device (480 if unknown)
+        """
+        try:
+            # no traffic (used to size the batched requests, including the device properties read)
+            size=int(self.cachedProperty('maxApduLengthAccepted'))
+            if size>0:
+                return size
+        except:
+            pass
+        return 480
+
+    def isRPMSupported(self):
+        """return True if the device accepts ReadPropertyMultiple requests, False if not and None if still unknown
+        """
+        return self._rpmSupported
+
+    def setRPMSupported(self, state=True):
+        self._rpmSupported=bool(state)
+
+    def batchReader(self):
+        """create a BACBatchReader object, grouping reads on this device into ReadPropertyMultiple requests"""
+        return BACBatchReader(self)
+
+    def isWPMSupported(self):
+        """return True if the device accepts WritePropertyMultiple requests, False if not and None if still unknown
+        """
+        return self._wpmSupported
+
+    def setWPMSupported(self, state=True):
+        self._wpmSupported=bool(state)
+
+    def batchWriter(self, window=4):
+        """create a BACBatchWriter object, grouping writes on this device into WritePropertyMultiple requests
+        (or pipelined single writes, with at most window requests in flight)"""
+        return BACBatchWriter(self, window)
+
+    def singleFlight(self, key, function, *args):
+        """return function(*args), or the result of the identical request (same key, i.e. (objectType, instance, property, index))
+        already in flight on this device"""
+        return self._parent.singleFlight.call((self._did,)+tuple(key), function, *args)
+
+    def measure(self, service):
+        """return a context manager measuring a request of the given service to this device (see BACMetrics).
+        Raise BACDeviceUnavailableError (fail fast, no request sent) if the device's circuit breaker is open"""
+        return BACGuardedMeasure(self._breaker, self._parent.metrics.measure(self._did, service))
+
     @property
     def did(self):
         """return the deviceId"""
@@ -182,22 +544,133 @@ class BACDevice(object):
         """
         return self._address
 
+    @property
+    def health(self):
+        """BACDeviceHealth object (up/down, last rtt, last seen) updated by ping() and probe() (readonly)
+        """
+        return self._health
+
+    @property
+    def breaker(self):
+        """BACCircuitBreaker object, opened after repeated timeouts to pause the device (readonly)
+        """
+        return self._breaker
+
+    def isAvailable(self):
+        """return False if the device is quarantined (circuit breaker open, requests failing fast)
+        """
+        return not self._breaker.isOpen()
+
+    def pollDelay(self):
+        """return the BAC0 polling period (seconds) of the device, 0 if not polled by BAC0"""
+        try:
+            return self._bac0device.properties.pollDelay or 0
+        except:
+            pass
+        return 0
+
+    def lastResponse(self):
+        """return the timestamp of the last known answer of the device (request through this module, or value
+        updated by the BAC0 polling of it's first points), or None (no traffic)"""
+        stamps=[self._breaker.lastSuccess, self._health.lastSeen]
+        for point in self.points.points[:3]:
+            try:
+                stamps.append(point.bac0point.lastTimestamp.timestamp())
+            except:
+                pass
+        stamps=[stamp for stamp in stamps if stamp is not None]
+        if stamps:
+            return max(stamps)
+
+    def _onUnavailable(self):
+        # called by the circuit breaker when it opens : pause the BAC0 polling
+        try:
+            delay=self._bac0device.properties.pollDelay
+            if delay:
+                self._pausedPollDelay=delay
+                self.pollStop()
+        except:
+            pass
+
+    def _onAvailable(self):
+        # called by the circuit breaker when it closes : resume the BAC0 polling
+        delay=self._pausedPollDelay
+        self._pausedPollDelay=None
+        if delay:
+            try:
+                self.poll(delay)
+            except:
+                self.logger.exception('unable to resume the polling of device %d' % self._did)
+
     def ping(self):
         """send a request to the device to check if it's alive (responding)
         """
-        return self._bac0device.ping()
+        t0=time.time()
+        try:
+            with self.measure('readProperty'):
+                alive=self._bac0device.ping()
+                if not alive:
+                    raise IOError('noResponse from device %d' % self._did)
+        except:
+            alive=False
+        if alive:
+            self._health.success(time.time()-t0)
+        else:
+            self._health.failure()
+        return alive
+
+    def probe(self, timeout=None):
+        """read the objectName of the device (waiting at most timeout seconds for the response) to check if it's alive,
+        updating the device's health. Return True if the device answered
+        """
+        t0=time.time()
+        try:
+            request='%s device %d objectName' % (self._address, self._did)
+            with self.measure('readProperty'):
+                if timeout:
+                    value=self.bac0.read(request, timeout=timeout)
+                else:
+                    value=self.bac0.read(request)
+                if value is None:
+                    raise IOError('noResponse from device %d' % self._did)
+            self._health.success(time.time()-t0)
+            return True
+        except:
+            pass
+        self._health.failure()
+        return False
 
     def poll(self, delay=15):
         """Register a device task that poll each all points on this device
         """
         self.pollStop()
         self._bac0device.poll(delay=delay)
+        if delay:
+            self._parent.watchdog.start()
 
     def pollStop(self):
         """Unregister the device point's polling task
         """
         self._bac0device.poll(command='stop')
 
+    def schedule(self, rateClass='normal'):
+        """Replace the uniform device polling by the BAC's adaptive poll scheduler (each point being registered
+        with the given rate class, see BACPoints.schedule() to set a specific class on some points)
+        """
+        self.pollStop()
+        self.points.schedule(rateClass)
+
+    def scheduleStop(self):
+        self.points.scheduleStop()
+
+    def enableHistory(self, size=8640):
+        """enable the values history of each point in a fixed size ring buffer (see BACPoint.enableHistory()).
+        Return the number of bytes reserved"""
+        return self.points.enableHistory(size)
+
+    def disableHistory(self):
+        self.points.disableHistory()
+
     def isPolled(self):
         """return True if this device seems to be polled (periodic read of each registered point)
         """
@@ -226,15 +699,16 @@ class BACDevice(object):
             pass
 
     def refresh(self, keys=None):
-        """force refresh of devices registered points (calling self.points.refresh())
+        """force refresh of devices registered points (calling self.points.refresh()). Return the number of requests sent
         """
-        self.points.refresh(keys)
+        return self.points.refresh(keys)
 
     def __iter__(self):
         return iter(self.points)
 
-    def dump(self):
-        """dump device informations
+    def dump(self, cached=False):
+        """dump device informations. With cached=True, only the last known properties are shown (no traffic),
+        unknown ones as '?'
         """
         t=PrettyTable()
         t.field_names=['property', 'value']
@@ -242,11 +716,16 @@ class BACDevice(object):
         t.align['value']='l'
         t.add_row(['address', self.address])
         t.add_row(['id', self.did])
-        t.add_row(['name', self.name])
-        t.add_row(['description', self.description])
-        t.add_row(['systemStatus', self.systemStatus])  # generate traffic
-        t.add_row(['vendorName', self.vendorName])
-        t.add_row(['vendorIdentifier', self.vendorIdentifier])
+        if cached:
+            for name in ['objectName', 'description', 'systemStatus', 'vendorName', 'vendorIdentifier']:
+                value=self.cachedProperty(name)
+                t.add_row([name if name!='objectName' else 'name', '?' if value is None else value])
+        else:
+            t.add_row(['name', self.name])
+            t.add_row(['description', self.description])
+            t.add_row(['systemStatus', self.systemStatus])  # generate traffic
+            t.add_row(['vendorName', self.vendorName])
+            t.add_row(['vendorIdentifier', self.vendorIdentifier])
         t.add_row(['points', self.points.count()])
         t.add_row(['segmentationSupported', str(self.isSegmentationSupported())])
         for ptype in ['analogInput', 'analogOutput', 'binaryInput', 'binaryOutput', 'analogValue', 'binaryValue', 'multiStateValue']:
@@ -256,15 +735,25 @@ class BACDevice(object):
 
         print(t)
 
+    def snapshot(self, keys=None):
+        """return a columnar BACSnapshot of the device's points, without any traffic (see BACPoints.snapshot())"""
+        return self.points.snapshot(keys)
+
+    def export(self, path, keys=None, kind='snapshot', t0=None, t1=None, format=None, chunkSize=10000):
+        """stream the values or history of the device's points to a CSV or Parquet file (see BACPoints.export())"""
+        return self.points.export(path, keys, kind, t0, t1, format, chunkSize)
+
     def readPropertyRaw(self, prop):
         """send a native bacpypes/read request on the device (i.e prop=('analogValue', 1, 'presentValue'))
         """
-        return self._bac0device.read_property(prop)
+        with self.measure('readProperty'):
+            return self._bac0device.read_property(prop)
 
     def writePropertyRaw(self, prop, value, priority=16):
         """send a native bacpypes/write request on the device (i.e prop=('analogValue', 1, 'presentValue'))
         """
-        return self._bac0device.write_property(prop)
+        with self.measure('writeProperty'):
+            return self._bac0device.write_property(prop)
 
     def bag(self, key=None):
         """create a BACPointsBag object (a kind of point's view or points collection) associated to this device"""
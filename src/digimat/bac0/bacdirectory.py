@@ -0,0 +1,129 @@
+#!/bin/python
+
+import time
+import threading
+
+
+class BACDirectoryEntry(object):
+    """A device seen on the network (by an I-Am response), with it's expiration time"""
+    def __init__(self, did, address, ttl):
+        self._did=int(did)
+        self._address=str(address)
+        self._ttl=ttl
+        self._stamp=time.time()
+
+    def __repr__(self):
+        return '<%s(%d@%s, %ds)>' % (self.__class__.__name__, self._did, self._address, self.age())
+
+    @property
+    def did(self):
+        return self._did
+
+    @property
+    def address(self):
+        return self._address
+
+    @property
+    def ttl(self):
+        return self._ttl
+
+    def age(self):
+        """return the age (seconds) of the last I-Am received from this device"""
+        return time.time()-self._stamp
+
+    def isExpired(self):
+        if self._ttl and self.age()>self._ttl:
+            return True
+        return False
+
+
+class BACDeviceDirectory(object):
+    """Directory of the devices seen on the network, continuously filled by I-Am responses, indexed by id and address.
+    Should be used through the BAC object (bacnet.directory)
+    """
+    def __init__(self, ttl=3600):
+        self._ttl=ttl
+        self._entriesById={}
+        self._entriesByAddress={}
+        self._lock=threading.Lock()
+
+    def __repr__(self):
+        return '<%s(%d devices)>' % (self.__class__.__name__, len(self._entriesById))
+
+    @property
+    def ttl(self):
+        """default ttl (seconds) of the entries"""
+        return self._ttl
+
+    def update(self, did, address, ttl=None):
+        """register (or refresh) the device given by it's id and address"""
+        try:
+            if ttl is None:
+                ttl=self._ttl
+            entry=BACDirectoryEntry(did, address, ttl)
+            with self._lock:
+                previous=self._entriesById.get(entry.did)
+                if previous and previous.address!=entry.address:
+                    # device has moved
+                    if self._entriesByAddress.get(previous.address) is previous:
+                        del self._entriesByAddress[previous.address]
+                self._entriesById[entry.did]=entry
+                self._entriesByAddress[entry.address]=entry
+            return entry
+        except:
+            pass
+
+    def remove(self, did):
+        with self._lock:
+            entry=self._entriesById.pop(int(did), None)
+            if entry and self._entriesByAddress.get(entry.address) is entry:
+                del self._entriesByAddress[entry.address]
+
+    def entry(self, did):
+        """return the (possibly expired) entry of the device id"""
+        try:
+            return self._entriesById[int(did)]
+        except:
+            pass
+
+    def getAddress(self, did):
+        """return the address of the device id, or None if unknown or expired"""
+        entry=self.entry(did)
+        if entry and not entry.isExpired():
+            return entry.address
+
+    def getId(self, address):
+        """return the id of the device at the given address, or None if unknown or expired"""
+        try:
+            entry=self._entriesByAddress[str(address)]
+            if not entry.isExpired():
+                return entry.did
+        except:
+            pass
+
+    def purge(self):
+        """remove the expired entries"""
+        for entry in self.entries():
+            if entry.isExpired():
+                self.remove(entry.did)
+
+    def entries(self):
+        with self._lock:
+            return list(self._entriesById.values())
+
+    def items(self):
+        """return a list of (address, did) of the non expired entries (as returned by a whois)"""
+        return [(entry.address, entry.did) for entry in self.entries() if not entry.isExpired()]
+
+    def count(self):
+        return len(self._entriesById)
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self.entries())
+
+
+if __name__ == "__main__":
+    pass
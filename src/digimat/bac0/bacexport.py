@@ -0,0 +1,144 @@
+#!/bin/python
+
+import csv
+import os
+
+from .bachistory import BACHistory
+
+
+class BACCSVWriter(object):
+    """Append rows to a CSV file (header written on creation)"""
+    def __init__(self, path, columns):
+        self._file=open(path, 'w', newline='')
+        self._writer=csv.writer(self._file)
+        self._writer.writerow([name for name, ctype in columns])
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class BACParquetWriter(object):
+    """Append rows to a Parquet file, each write() being a new row group. Needs the pyarrow module (pip install pyarrow)"""
+    def __init__(self, path, columns):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('Parquet export needs the pyarrow module (pip install pyarrow)')
+        self._pyarrow=pyarrow
+        self._names=[name for name, ctype in columns]
+        self._schema=pyarrow.schema([(name, getattr(pyarrow, ctype)()) for name, ctype in columns])
+        self._writer=pyarrow.parquet.ParquetWriter(path, self._schema)
+
+    def write(self, rows):
+        data={}
+        for n, name in enumerate(self._names):
+            data[name]=[row[n] for row in rows]
+        self._writer.write_table(self._pyarrow.Table.from_pydict(data, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+class BACExporter(object):
+    """Streaming export of point values ('snapshot' : one row per point) or history ('history' : one row per sample)
+    to a CSV or Parquet file (format given or guessed from the file extension). Rows are buffered and written by chunks
+    of chunkSize rows, so the memory used doesn't depend on the number of exported rows. Values are read from the points
+    cached data (no traffic).
+
+    >>> with BACExporter('/tmp/points.csv') as exporter:
+    ...     for point in device.points:
+    ...         exporter.addPoint(point)
+    """
+    # (name, type) of each column, types being pyarrow type factories
+    SNAPSHOT_COLUMNS=[('did', 'int64'), ('descriptor', 'string'), ('name', 'string'),
+                      ('value', 'float64'), ('text', 'string'), ('unit', 'string'), ('stamp', 'float64')]
+    HISTORY_COLUMNS=[('did', 'int64'), ('descriptor', 'string'), ('stamp', 'float64'), ('value', 'float64')]
+    FORMATS=['csv', 'parquet']
+
+    def __init__(self, path, kind='snapshot', format=None, chunkSize=10000):
+        if kind not in ('snapshot', 'history'):
+            raise ValueError('unknown export kind %s' % kind)
+        if format is None:
+            format=os.path.splitext(path)[1][1:].lower() or 'csv'
+        if format not in self.FORMATS:
+            raise ValueError('unknown export format %s' % format)
+        self._path=path
+        self._kind=kind
+        self._format=format
+        self._chunkSize=max(1, int(chunkSize))
+        self._rows=[]
+        self._rowCount=0
+        columns=self.SNAPSHOT_COLUMNS if kind=='snapshot' else self.HISTORY_COLUMNS
+        if format=='parquet':
+            self._writer=BACParquetWriter(path, columns)
+        else:
+            self._writer=BACCSVWriter(path, columns)
+
+    def __repr__(self):
+        return '<%s(%s, %s, %d rows)>' % (self.__class__.__name__, self._path, self._format, self._rowCount)
+
+    @property
+    def rowCount(self):
+        """number of rows exported (readonly)"""
+        return self._rowCount
+
+    def _add(self, row):
+        self._rows.append(row)
+        self._rowCount+=1
+        if len(self._rows)>=self._chunkSize:
+            self.flush()
+
+    def addPoint(self, point):
+        """add the actual value of the point (snapshot export)"""
+        try:
+            value=point.cachedValue()
+            stamp=None
+            try:
+                stamp=point.bac0point.lastTimestamp.timestamp()
+            except:
+                pass
+            row=[point.device.did, point.descriptor, point.name,
+                 BACHistory.toFloat(value), None if value is None else str(point.strvalue(True)),
+                 point.unit, stamp]
+        except Exception as e:
+            # not exported (not counted in rowCount)
+            point.device.logger.debug('unable to export point %s (%s)' % (point.descriptor, e))
+            return
+        self._add(row)
+
+    def addHistory(self, point, t0=None, t1=None):
+        """add the history samples of the point recorded between t0 and t1 (history export)"""
+        history=point.history
+        if history is not None:
+            did=point.device.did
+            for stamp, value in history.range(t0, t1):
+                self._add([did, point.descriptor, stamp, value])
+
+    def add(self, point, t0=None, t1=None):
+        if self._kind=='snapshot':
+            self.addPoint(point)
+        else:
+            self.addHistory(point, t0, t1)
+
+    def flush(self):
+        if self._rows:
+            self._writer.write(self._rows)
+            self._rows=[]
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+if __name__ == "__main__":
+    pass
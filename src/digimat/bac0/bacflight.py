@@ -0,0 +1,80 @@
+#!/bin/python
+
+import threading
+
+
+class BACFlight(object):
+    """An outstanding request of a BACSingleFlight, shared by every concurrent caller"""
+    __slots__=('_event', '_result', '_error')
+
+    def __init__(self):
+        self._event=threading.Event()
+        self._result=None
+        self._error=None
+
+
+class BACSingleFlight(object):
+    """In-flight requests table of a BAC object. Concurrent callers asking for the same key (device, object, property, index)
+    share a single outstanding request : the first caller sends it, the others wait for it's result (or exception).
+    Should be used through the BAC object (bacnet.singleFlight)
+    """
+    def __init__(self):
+        self._flights={}
+        self._lock=threading.Lock()
+        self._callCount=0
+        self._sharedCount=0
+
+    def __repr__(self):
+        return '<%s(%d in flight, %d/%d shared)>' % (self.__class__.__name__,
+            len(self._flights), self._sharedCount, self._callCount)
+
+    @property
+    def callCount(self):
+        """number of calls (readonly)"""
+        return self._callCount
+
+    @property
+    def sharedCount(self):
+        """number of calls answered by another caller's request (readonly)"""
+        return self._sharedCount
+
+    def count(self):
+        """return the number of outstanding requests"""
+        return len(self._flights)
+
+    def __len__(self):
+        return self.count()
+
+    def call(self, key, function, *args):
+        """return function(*args), or the result of the identical request (same key) already in flight"""
+        with self._lock:
+            self._callCount+=1
+            flight=self._flights.get(key)
+            if flight is not None:
+                self._sharedCount+=1
+                leader=False
+            else:
+                flight=BACFlight()
+                self._flights[key]=flight
+                leader=True
+
+        if not leader:
+            flight._event.wait()
+            if flight._error is not None:
+                raise flight._error
+            return flight._result
+
+        try:
+            flight._result=function(*args)
+            return flight._result
+        except Exception as e:
+            flight._error=e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight._event.set()
+
+
+if __name__ == "__main__":
+    pass
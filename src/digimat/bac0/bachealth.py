@@ -0,0 +1,124 @@
+#!/bin/python
+
+import time
+
+from prettytable import PrettyTable
+
+
+class BACDeviceHealth(object):
+    """Liveness state of a BACDevice : up/down, last round trip time and time of the last response"""
+    __slots__=('_up', '_rtt', '_lastSeen', '_lastCheck', '_checkCount', '_failCount')
+
+    def __init__(self):
+        self._up=None
+        self._rtt=None
+        self._lastSeen=None
+        self._lastCheck=None
+        self._checkCount=0
+        self._failCount=0
+
+    def __repr__(self):
+        return '<%s(%s, rtt=%s)>' % (self.__class__.__name__, self.state(),
+            '%.1fms' % (self._rtt*1000.0) if self._rtt is not None else 'N/A')
+
+    def success(self, rtt):
+        now=time.time()
+        self._up=True
+        self._rtt=rtt
+        self._lastSeen=now
+        self._lastCheck=now
+        self._checkCount+=1
+
+    def failure(self):
+        self._up=False
+        self._lastCheck=time.time()
+        self._checkCount+=1
+        self._failCount+=1
+
+    def isUp(self):
+        """return True if the device answered the last check, False if not and None if never checked"""
+        return self._up
+
+    def state(self):
+        if self._up is None:
+            return 'unknown'
+        return 'up' if self._up else 'down'
+
+    @property
+    def rtt(self):
+        """round trip time (seconds) of the last successful check"""
+        return self._rtt
+
+    @property
+    def lastSeen(self):
+        """timestamp of the last response of the device"""
+        return self._lastSeen
+
+    @property
+    def lastCheck(self):
+        return self._lastCheck
+
+    @property
+    def checkCount(self):
+        return self._checkCount
+
+    @property
+    def failCount(self):
+        return self._failCount
+
+
+class BACHealthReport(object):
+    """Result of a liveness sweep (see BAC.sweep()) : the BACDeviceHealth of each checked device"""
+    def __init__(self, duration=0.0):
+        self._devices=[]
+        self._duration=duration
+
+    def __repr__(self):
+        return '<%s(%d up, %d down, %.1fs)>' % (self.__class__.__name__, len(self.up()), len(self.down()), self._duration)
+
+    def add(self, device):
+        self._devices.append(device)
+
+    @property
+    def duration(self):
+        """duration (seconds) of the sweep"""
+        return self._duration
+
+    def devices(self):
+        return list(self._devices)
+
+    def up(self):
+        return [device for device in self._devices if device.health.isUp()]
+
+    def down(self):
+        return [device for device in self._devices if not device.health.isUp()]
+
+    def count(self):
+        return len(self._devices)
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self._devices)
+
+    def dump(self):
+        t=PrettyTable()
+        t.field_names=['id', 'address', 'name', 'state', 'circuit', 'rtt', 'last seen', 'fails']
+        t.align['name']='l'
+        t.align['rtt']='r'
+        t.align['last seen']='r'
+        t.align['fails']='r'
+        now=time.time()
+        for device in sorted(self._devices, key=lambda device: (device.health.isUp() is True, device.did)):
+            health=device.health
+            name=device.cachedProperty('objectName')
+            t.add_row([device.did, device.address, name if name is not None else '?', health.state(), device.breaker.state,
+                       '%.1fms' % (health.rtt*1000.0) if health.rtt is not None else 'N/A',
+                       '%ds' % (now-health.lastSeen) if health.lastSeen is not None else 'never',
+                       health.failCount])
+        print(t)
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,170 @@
+#!/bin/python
+
+import time
+import array
+import threading
+
+
+class BACHistory(object):
+    """Fixed size ring buffer of (timestamp, value) samples of a point. Values are stored as float64 and timestamps as
+    int64 (milliseconds since epoch) in two preallocated arrays, so the memory used by a history is known at creation
+    (16 bytes per sample, i.e. 138KB for 24 hours of 10 seconds samples) and never grows. Samples being recorded in time
+    order, time range queries are binary searches (O(log n)).
+    Should be created from the BACPoint object, with something like point.enableHistory(size)
+    """
+    def __init__(self, size=8640):
+        self._size=max(1, int(size))
+        self._values=array.array('d', bytes(8*self._size))
+        self._stamps=array.array('q', bytes(8*self._size))
+        # position of the oldest sample and number of samples
+        self._head=0
+        self._count=0
+        self._lock=threading.Lock()
+
+    def __repr__(self):
+        return '<%s(%d/%d samples, %dKB)>' % (self.__class__.__name__, self._count, self._size, self.memorySize()/1024)
+
+    @property
+    def size(self):
+        """max number of samples (readonly)"""
+        return self._size
+
+    def count(self):
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def memorySize(self):
+        """return the number of bytes used by the samples buffers"""
+        return self._values.itemsize*self._size+self._stamps.itemsize*self._size
+
+    @staticmethod
+    def toFloat(value):
+        """convert a point value (float, bool, int, 'n:label' or 'active'/'inactive' string) to float, or None"""
+        if type(value) is bool:
+            return 1.0 if value else 0.0
+        if type(value) is str:
+            if value=='active':
+                return 1.0
+            if value=='inactive':
+                return 0.0
+            value=value.split(':')[0]
+        try:
+            return float(value)
+        except:
+            pass
+
+    def record(self, value, stamp=None):
+        """add a sample (stamp being a timestamp in seconds, default to now), overwriting the oldest one when the buffer is full.
+        A sample older than the last recorded one is ignored. Return True if the sample has been recorded"""
+        value=self.toFloat(value)
+        if value is None:
+            return False
+        if stamp is None:
+            stamp=time.time()
+        stamp=int(stamp*1000)
+        with self._lock:
+            if self._count>0 and stamp<self._stamps[(self._head+self._count-1) % self._size]:
+                return False
+            if self._count<self._size:
+                position=(self._head+self._count) % self._size
+                self._count+=1
+            else:
+                position=self._head
+                self._head=(self._head+1) % self._size
+            self._values[position]=value
+            self._stamps[position]=stamp
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._head=0
+            self._count=0
+
+    def _stamp(self, n):
+        return self._stamps[(self._head+n) % self._size]
+
+    def _bisect(self, stamp, right=False):
+        """return the rank (0..count) of the first sample with a timestamp >= stamp (> stamp if right)"""
+        lo=0
+        hi=self._count
+        while lo<hi:
+            mid=(lo+hi)//2
+            t=self._stamp(mid)
+            if t<stamp or (right and t==stamp):
+                lo=mid+1
+            else:
+                hi=mid
+        return lo
+
+    def _bounds(self, t0=None, t1=None):
+        """return the ranks [start, end) of the samples with t0 <= timestamp <= t1 (seconds)"""
+        start=0
+        end=self._count
+        if t0 is not None:
+            start=self._bisect(int(t0*1000))
+        if t1 is not None:
+            end=self._bisect(int(t1*1000), right=True)
+        return start, max(start, end)
+
+    def _window(self, t0, t1, window):
+        if window is not None:
+            t1=time.time()
+            t0=t1-window
+        return t0, t1
+
+    def _slice(self, buf, start, end):
+        """return the buffer items of the ranks [start, end) as a list"""
+        a=(self._head+start) % self._size
+        b=(self._head+end) % self._size
+        if end-start<=0:
+            return []
+        if a<b:
+            return buf[a:b].tolist()
+        return buf[a:].tolist()+buf[:b].tolist()
+
+    def range(self, t0=None, t1=None, window=None):
+        """return the list of (timestamp, value) samples between t0 and t1 (seconds since epoch), or of the last window seconds"""
+        t0, t1=self._window(t0, t1, window)
+        with self._lock:
+            start, end=self._bounds(t0, t1)
+            stamps=self._slice(self._stamps, start, end)
+            values=self._slice(self._values, start, end)
+        return [(stamp/1000.0, value) for stamp, value in zip(stamps, values)]
+
+    def values(self, t0=None, t1=None, window=None):
+        """return the list of values between t0 and t1 (seconds since epoch), or of the last window seconds"""
+        t0, t1=self._window(t0, t1, window)
+        with self._lock:
+            start, end=self._bounds(t0, t1)
+            return self._slice(self._values, start, end)
+
+    def last(self):
+        """return the last (timestamp, value) sample, or None"""
+        with self._lock:
+            if self._count>0:
+                position=(self._head+self._count-1) % self._size
+                return self._stamps[position]/1000.0, self._values[position]
+
+    def min(self, t0=None, t1=None, window=None):
+        values=self.values(t0, t1, window)
+        if values:
+            return min(values)
+
+    def max(self, t0=None, t1=None, window=None):
+        values=self.values(t0, t1, window)
+        if values:
+            return max(values)
+
+    def mean(self, t0=None, t1=None, window=None):
+        values=self.values(t0, t1, window)
+        if values:
+            return sum(values)/len(values)
+
+    def __iter__(self):
+        return iter(self.range())
+
+
+if __name__ == "__main__":
+    pass
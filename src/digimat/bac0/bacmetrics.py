@@ -0,0 +1,241 @@
+#!/bin/python
+
+import time
+import threading
+import http.server
+
+from prettytable import PrettyTable
+
+from .bacbatch import isTimeoutError
+
+
+class BACServiceMetrics(object):
+    """Counters and latency histogram of a BACnet service (readProperty, writeProperty, ...) sent to a device"""
+    # latency histogram buckets upper bounds (seconds)
+    BUCKETS=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, did, service):
+        self._did=did
+        self._service=service
+        self._count=0
+        self._errorCount=0
+        self._timeoutCount=0
+        self._sum=0.0
+        self._buckets=[0]*(len(self.BUCKETS)+1)
+
+    def __repr__(self):
+        return '<%s(%s:%s, %d requests, %.1fms)>' % (self.__class__.__name__,
+            self._did, self._service, self._count, self.mean()*1000.0)
+
+    @property
+    def did(self):
+        return self._did
+
+    @property
+    def service(self):
+        return self._service
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def errorCount(self):
+        return self._errorCount
+
+    @property
+    def timeoutCount(self):
+        return self._timeoutCount
+
+    @property
+    def sum(self):
+        """total duration (seconds) of the requests"""
+        return self._sum
+
+    def observe(self, duration, error=None):
+        self._count+=1
+        self._sum+=duration
+        if error is not None:
+            self._errorCount+=1
+            if isTimeoutError(error):
+                self._timeoutCount+=1
+        for n, bound in enumerate(self.BUCKETS):
+            if duration<=bound:
+                self._buckets[n]+=1
+                return
+        self._buckets[-1]+=1
+
+    def mean(self):
+        if self._count:
+            return self._sum/self._count
+        return 0.0
+
+    def quantile(self, q):
+        """return the (bucket upper bound) estimation of the q quantile (0..1) of the latency"""
+        if self._count:
+            rank=q*self._count
+            total=0
+            for n, bound in enumerate(self.BUCKETS):
+                total+=self._buckets[n]
+                if total>=rank:
+                    return bound
+            return float('inf')
+
+    def cumulativeBuckets(self):
+        """return the list of (upper bound, cumulative count) pairs, as exposed by Prometheus"""
+        buckets=[]
+        total=0
+        for n, bound in enumerate(self.BUCKETS):
+            total+=self._buckets[n]
+            buckets.append((bound, total))
+        buckets.append((float('inf'), self._count))
+        return buckets
+
+
+class BACMeasure(object):
+    """Context manager measuring a request (see BACMetrics.measure())"""
+    __slots__=('_metrics', '_did', '_service', '_t0')
+
+    def __init__(self, metrics, did, service):
+        self._metrics=metrics
+        self._did=did
+        self._service=service
+
+    def __enter__(self):
+        self._t0=time.perf_counter()
+        return self
+
+    def __exit__(self, etype, error, traceback):
+        self._metrics.observe(self._did, self._service, time.perf_counter()-self._t0, error)
+        return False
+
+
+class BACMetrics(object):
+    """Per device and per service requests metrics (counters and latency histograms) of a BAC object, exported as
+    Prometheus text (prometheus() or the local HTTP endpoint started by serve()).
+    Should be used through the BAC object (bacnet.metrics)
+
+    >>> with bacnet.metrics.measure(8015, 'readProperty'):
+    ...     bacnet.bac0.read(...)
+    """
+    PREFIX='bac0'
+
+    def __init__(self, parent):
+        # assert(isinstance(parent, BAC))
+        self._parent=parent
+        self._services={}
+        self._lock=threading.Lock()
+        self._server=None
+
+    def __repr__(self):
+        return '<%s(%d series)>' % (self.__class__.__name__, len(self._services))
+
+    @property
+    def logger(self):
+        return self._parent.logger
+
+    def measure(self, did, service):
+        """return a context manager measuring the request of the given service to the device (did may be None for
+        broadcasts), an exception being counted as an error (and as a timeout if the device didn't answer)"""
+        return BACMeasure(self, did, service)
+
+    def observe(self, did, service, duration, error=None):
+        key=(did, service)
+        with self._lock:
+            metrics=self._services.get(key)
+            if metrics is None:
+                metrics=BACServiceMetrics(did, service)
+                self._services[key]=metrics
+            metrics.observe(duration, error)
+
+    def services(self, did=None):
+        """return the BACServiceMetrics objects (of the given device id)"""
+        with self._lock:
+            return [m for m in self._services.values() if did is None or m.did==did]
+
+    def get(self, did, service):
+        return self._services.get((did, service))
+
+    def reset(self):
+        with self._lock:
+            self._services={}
+
+    def _labels(self, metrics, extra=None):
+        labels='did="%s",service="%s"' % ('' if metrics.did is None else metrics.did, metrics.service)
+        if extra:
+            labels+=','+extra
+        return '{%s}' % labels
+
+    def prometheus(self):
+        """return the metrics as Prometheus text exposition format"""
+        services=sorted(self.services(), key=lambda m: (str(m.did), m.service))
+        prefix=self.PREFIX
+        lines=[]
+        for name, mtype, help, value in [('requests_total', 'counter', 'Number of requests sent', lambda m: m.count),
+                                         ('request_errors_total', 'counter', 'Number of failed requests', lambda m: m.errorCount),
+                                         ('request_timeouts_total', 'counter', 'Number of requests without response', lambda m: m.timeoutCount)]:
+            lines.append('# HELP %s_%s %s' % (prefix, name, help))
+            lines.append('# TYPE %s_%s %s' % (prefix, name, mtype))
+            for metrics in services:
+                lines.append('%s_%s%s %d' % (prefix, name, self._labels(metrics), value(metrics)))
+
+        name='%s_request_duration_seconds' % prefix
+        lines.append('# HELP %s Requests round trip time' % name)
+        lines.append('# TYPE %s histogram' % name)
+        for metrics in services:
+            for bound, count in metrics.cumulativeBuckets():
+                le='+Inf' if bound==float('inf') else repr(bound)
+                lines.append('%s_bucket%s %d' % (name, self._labels(metrics, 'le="%s"' % le), count))
+            lines.append('%s_sum%s %f' % (name, self._labels(metrics), metrics.sum))
+            lines.append('%s_count%s %d' % (name, self._labels(metrics), metrics.count))
+        return '\n'.join(lines)+'\n'
+
+    def serve(self, port=9108, address='127.0.0.1'):
+        """start a local HTTP endpoint exposing the metrics to Prometheus (http://address:port/metrics)"""
+        if self._server is None:
+            metrics=self
+
+            class Handler(http.server.BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split('?')[0] not in ('/', '/metrics'):
+                        self.send_error(404)
+                        return
+                    data=metrics.prometheus().encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+
+                def log_message(self, format, *args):
+                    pass
+
+            self._server=http.server.ThreadingHTTPServer((address, int(port)), Handler)
+            self._server.daemon_threads=True
+            threading.Thread(target=self._server.serve_forever, name='BACMetrics', daemon=True).start()
+            self.logger.info('metrics exposed on http://%s:%d/metrics' % (address, int(port)))
+        return self._server
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server=None
+
+    def dump(self, did=None):
+        """dump the metrics (of the given device id), slowest devices first"""
+        t=PrettyTable()
+        t.field_names=['device', 'service', 'requests', 'errors', 'timeouts', 'mean', 'p50', 'p99']
+        t.align['service']='l'
+        for column in ['requests', 'errors', 'timeouts', 'mean', 'p50', 'p99']:
+            t.align[column]='r'
+        for metrics in sorted(self.services(did), key=lambda m: m.mean(), reverse=True):
+            t.add_row([metrics.did, metrics.service, metrics.count, metrics.errorCount, metrics.timeoutCount,
+                       '%.1fms' % (metrics.mean()*1000.0),
+                       '<%gms' % (metrics.quantile(0.5)*1000.0),
+                       '<%gms' % (metrics.quantile(0.99)*1000.0)])
+        print(t)
+
+
+if __name__ == "__main__":
+    pass
@@ -2,10 +2,11 @@
 
 import pkg_resources
 
-# import time
+import time
 import logging
 import logging.handlers
 import os
+import threading
 
 from prettytable import PrettyTable
 
@@ -18,6 +19,19 @@ import BAC0
 from .bacpoint import BACPoint
 from .bacpoints import BACPoints
 from .bacdevice import BACDevice
+from .bacdirectory import BACDeviceDirectory
+from .bacpool import BACNetworkPool
+from .baccache import BACDeviceCache
+from .baccov import BACCOVManager
+from .bacstream import BACChangeStream
+from .bacscheduler import BACPollScheduler
+from .bacexport import BACExporter
+from .bacmetrics import BACMetrics
+from .bacrecord import BACRecorder
+from .bacrecord import BACReplay
+from .bacflight import BACSingleFlight
+from .bachealth import BACHealthReport
+from .bacbreaker import BACDeviceWatchdog
 
 
 # Help to build a local node
@@ -36,7 +50,8 @@ class BAC(object):
                  vendorId=892, vendorName='Digimat',
                  description='https://pypi.org/project/digimat.bac0/',
                  location='Probably on planet earth',
-                 logServer='localhost', logLevel=logging.DEBUG):
+                 logServer='localhost', logLevel=logging.DEBUG,
+                 directoryTTL=3600, cachePath=None):
 
         logger=logging.getLogger("BAC(%s)" % network)
         logger.setLevel(logLevel)
@@ -45,6 +60,12 @@ class BAC(object):
         self._logger=logger
 
         self._bac0=None
+        self._metrics=BACMetrics(self)
+        self._singleFlight=BACSingleFlight()
+        self._directory=BACDeviceDirectory(ttl=directoryTTL)
+        self._cache=None
+        if cachePath:
+            self._cache=BACDeviceCache(cachePath)
         self.BAC0LogDisable()
 
         ifaces=self.getInterfaces([network])
@@ -97,6 +118,12 @@ class BAC(object):
         self._devicesByAddress={}
         self._devicesById={}
         self._devicesByIndex={}
+        self._lock=threading.RLock()
+        self._declareLocks={}
+        self._covManager=BACCOVManager(self)
+        self._changeStream=BACChangeStream()
+        self._scheduler=BACPollScheduler(self)
+        self._watchdog=BACDeviceWatchdog(self)
 
         self.open()
 
@@ -171,11 +198,121 @@ class BAC(object):
     def bac0(self):
         return self._bac0
 
+    @property
+    def directory(self):
+        """BACDeviceDirectory object of the devices seen on the network (id<->address), filled by I-Am responses (readonly)
+        """
+        return self._directory
+
+    @property
+    def cache(self):
+        """BACDeviceCache object storing the devices objectList and static metadata on disk, or None if disabled (readonly)
+        """
+        return self._cache
+
+    def readDatabaseRevision(self, did, address):
+        """read the databaseRevision property of the device (used to validate the device cache)"""
+        try:
+            with self._metrics.measure(int(did), 'readProperty'):
+                return self._bac0.read('%s device %d databaseRevision' % (address, int(did)))
+        except:
+            pass
+
+    def updateCache(self, device=None):
+        """save the objectList and static metadata of the device (or every declared device) in the device cache"""
+        if self._cache:
+            devices=self.devices()
+            if device is not None:
+                devices=[self.device(device)]
+            for device in devices:
+                if device is not None:
+                    objectList, points, properties=device.cacheData()
+                    revision=self.readDatabaseRevision(device.did, device.address)
+                    if revision is None:
+                        # don't overwrite a good entry with an unknown revision
+                        self.logger.warning('unable to read the databaseRevision of device %d, cache not updated' % device.did)
+                        continue
+                    self._cache.store(device.did, device.address, revision, objectList, points, properties)
+
+    def _hookIAm(self):
+        """feed the directory with every I-Am received by the BAC0 application"""
+        try:
+            application=self._bac0.this_application
+            handler=application.do_IAmRequest
+
+            def do_IAmRequest(apdu):
+                try:
+                    self._directory.update(apdu.iAmDeviceIdentifier[1], apdu.pduSource)
+                except:
+                    pass
+                return handler(apdu)
+
+            application.do_IAmRequest=do_IAmRequest
+        except:
+            self.logger.warning('unable to hook I-Am responses, directory will only be filled by whois()')
+
     def open(self):
         if self._bac0:
+            self._hookIAm()
             self.whois()
 
+    @property
+    def covManager(self):
+        """BACCOVManager object, renewing the COV subscriptions and enforcing the per device subscriptions budget (readonly)
+        """
+        return self._covManager
+
+    @property
+    def changeStream(self):
+        """BACChangeStream object dispatching the COV notifications to the consumers (readonly)
+        """
+        return self._changeStream
+
+    def changes(self, filter=None, did=None, descriptors=None, maxsize=1000, overflow='dropOldest'):
+        """return a new BACChangeConsumer, a bounded queue (iterable) of the (device, descriptor, value, timestamp) events
+        pushed by COV notifications, optionally filtered by a function, device id(s) or point descriptor(s).
+        overflow is the policy applied when the queue is full ('dropOldest', 'dropNewest' or 'block')"""
+        return self._changeStream.consumer(filter=filter, did=did, descriptors=descriptors, maxsize=maxsize, overflow=overflow)
+
+    @property
+    def metrics(self):
+        """BACMetrics object, counting the requests sent to each device with their latency (readonly)
+        """
+        return self._metrics
+
+    @property
+    def singleFlight(self):
+        """BACSingleFlight object, sharing an outstanding read between concurrent callers asking for the same property (readonly)
+        """
+        return self._singleFlight
+
+    def record(self, path):
+        """start recording every confirmed request (with it's response and timing) into the capture file.
+        Return the started BACRecorder (stop it with .stop(), or use it as a context manager)"""
+        return BACRecorder(self, path).start()
+
+    def replay(self, path, timeScale=0.0):
+        """serve every confirmed request from a capture file recorded by record(), immediately (timeScale=0)
+        or after the recorded round trip times multiplied by timeScale. Return the started BACReplay"""
+        return BACReplay(self, path, timeScale).start()
+
+    @property
+    def scheduler(self):
+        """BACPollScheduler object, polling the scheduled points with adaptive intervals and batched reads (readonly)
+        """
+        return self._scheduler
+
+    @property
+    def watchdog(self):
+        """BACDeviceWatchdog object, probing the BAC0 polled devices whose values are stale (readonly)
+        """
+        return self._watchdog
+
     def close(self):
+        self._watchdog.stop()
+        self._scheduler.stop()
+        self._covManager.stop()
+        self._metrics.stop()
         if self._bac0:
             self._bac0.disconnect()
 
@@ -203,20 +340,64 @@ class BAC(object):
             pass
 
     def devices(self, key=None):
-        return self._devices.values()
+        with self._lock:
+            return list(self._devices.values())
 
     def whois(self, network='*:*', autoDeclareDevices=False):
         if self._bac0:
-            return self._bac0.whois(network)
-
-    def discover(self, network='*:*'):
-        items=self.whois(network)
+            with self._metrics.measure(None, 'whoIs'):
+                items=self._bac0.whois(network)
+            if items:
+                for item in items:
+                    self._directory.update(item[1], item[0])
+            return items
+
+    def whoisDevice(self, did, address=None):
+        """send a ranged Who-Is for the given device id only (unicast if an address is given) and return it's address
+        """
+        did=int(did)
+        items=self.whois('%s %d %d' % (address or '*:*', did, did))
         if items:
-            devices=[]
             for item in items:
-                device=self.declareDevice(item[1], item[0])
-                devices.append(device)
-            return devices
+                if item[1]==did:
+                    return item[0]
+        return self._directory.getAddress(did)
+
+    def discoverIter(self, network='*:*', poll=15, filterOutOfService=False, workers=16, localLimit=8, remoteLimit=2, networkLimits=None):
+        """declare concurrently every device reported by a whois(network), yielding each BACDevice as soon as it is ready.
+        Concurrent declarations are bounded per BACnet network number (localLimit for the local network, remoteLimit
+        for networks behind a router, or networkLimits={2001: 1} for specific networks)"""
+        items=self.whois(network)
+        if items:
+            pool=BACNetworkPool(workers=workers, localLimit=localLimit, remoteLimit=remoteLimit, networkLimits=networkLimits)
+            tasks=[(item[0], self.declareDevice, (item[1], item[0], poll, filterOutOfService)) for item in items]
+            for task, device, error in pool.run(tasks):
+                if error is not None:
+                    self.logger.error('unable to declare device %s@%s (%s)' % (task[2][0], task[0], error))
+                    continue
+                if device is not None:
+                    yield device
+
+    def discover(self, network='*:*', poll=15, filterOutOfService=False, workers=16, localLimit=8, remoteLimit=2, networkLimits=None):
+        """declare concurrently every device reported by a whois(network) and return the list of the declared devices"""
+        return list(self.discoverIter(network, poll=poll, filterOutOfService=filterOutOfService,
+            workers=workers, localLimit=localLimit, remoteLimit=remoteLimit, networkLimits=networkLimits))
+
+    def sweep(self, timeout=3.0, workers=64, localLimit=32, remoteLimit=2, networkLimits=None):
+        """check concurrently if every declared device is alive (a single objectName read waiting at most timeout seconds),
+        with a bounded number of outstanding checks on each BACnet network (see discover()). Each device's health
+        (up/down, rtt, last seen) is updated. Return a BACHealthReport (use it's dump() method to display it)"""
+        t0=time.time()
+        pool=BACNetworkPool(workers=workers, localLimit=localLimit, remoteLimit=remoteLimit, networkLimits=networkLimits)
+        devices=self.devices()
+        tasks=[(device.address, device.probe, (timeout,)) for device in devices]
+        for task, result, error in pool.run(tasks):
+            if error is not None:
+                self.logger.error('unable to check device at %s (%s)' % (task[0], error))
+        report=BACHealthReport(time.time()-t0)
+        for device in devices:
+            report.add(device)
+        return report
 
     def retrieveDeviceObjectList(self, did, address=None):
         """retrieve the objectList of a device given by it's id (130) and it's address (2001:3)"""
@@ -224,57 +405,104 @@ class BAC(object):
             # TODO: On BAC0 (BAC0/BAC0/core/devices/mixins/read_mixin.py) there is a fallback implemented if segmentation is not supported
             address=address or self.getDeviceAddressFromId(did)
             if address:
-                return self._bac0.read('%s device %d objectList' % (address, did))
+                with self._metrics.measure(int(did), 'readProperty'):
+                    return self._bac0.read('%s device %d objectList' % (address, did))
         except:
             pass
 
-    def declareDevice(self, did, address=None, poll=15, filterOutOfService=False, objectList=None):
-        """declare a remote device specified by it's id (did, i.e 8015) and it's address (i.e 192.168.0.15 or 2001:3)"""
+    def _declareLock(self, did):
+        """return the lock serializing the declaration of the given device id"""
+        with self._lock:
+            return self._declareLocks.setdefault(int(did), threading.Lock())
+
+    def declareDevice(self, did, address=None, poll=15, filterOutOfService=False, objectList=None, lazy=False):
+        """declare a remote device specified by it's id (did, i.e 8015) and it's address (i.e 192.168.0.15 or 2001:3).
+        This method is thread safe (many devices may be declared concurrently)"""
         device=self.device(did)
+        if device is not None:
+            return device
         address=address or self.getDeviceAddressFromId(did)
-        if device is None:
-            if did and address:
-                device=BACDevice(self, did, address, index=len(self._devices), poll=poll, filterOutOfService=filterOutOfService, objectList=objectList)
-                self._devices[did]=device
-                self._devicesByName[device.name]=device
-                self._devicesById[address]=did
-                self._devicesByAddress[address]=device
-                self._devicesByIndex[device.index]=device
+        if address:
+            self._directory.update(did, address)
+        if did and address:
+            with self._declareLock(did):
+                device=self.device(did)
+                if device is None:
+                    metadata=None
+                    cached=self._cache is not None and objectList is None
+                    if cached:
+                        # warm start: a single databaseRevision read validates the cached objectList and metadata
+                        revision=self.readDatabaseRevision(did, address)
+                        if revision is None:
+                            # unknown revision (read failed), neither trust nor overwrite the cache entry
+                            cached=False
+                    if cached:
+                        metadata=self._cache.load(did, revision)
+                        if metadata:
+                            self.logger.info('Using cached objectList of device %s:%d' % (address, int(did)))
+                            objectList=self._cache.objectList(metadata)
+                    # BAC0 device creation may take a long time, don't block other declarations
+                    device=BACDevice(self, did, address, index=None, poll=poll, filterOutOfService=filterOutOfService, objectList=objectList, metadata=metadata, lazy=lazy)
+                    if cached and not metadata:
+                        objects, points, properties=device.cacheData()
+                        self._cache.store(did, address, revision, objects, points, properties)
+                    with self._lock:
+                        device._index=len(self._devices)
+                        self._devices[did]=device
+                        self._devicesByName[device.name]=device
+                        self._devicesById[address]=did
+                        self._devicesByAddress[address]=device
+                        self._devicesByIndex[device.index]=device
+                    if poll:
+                        self._watchdog.start()
         return device
 
     def getDeviceAddressFromId(self, did):
-        addresses=self.whois()
-        if addresses:
-            for adr in addresses:
-                if adr[1]==did:
-                    address=adr[0]
+        """return the address of the device id, from the directory (a targeted Who-Is is only sent if the device is unknown or expired)"""
+        try:
+            address=self._directory.getAddress(did)
+            if address:
+                return address
+            entry=self._directory.entry(did)
+            if entry:
+                # expired, first check if the device is still at the same place
+                address=self.whoisDevice(did, entry.address)
+                if address:
                     return address
+            return self.whoisDevice(did)
+        except:
+            pass
 
     def getDeviceIdFromAddress(self, address):
-        addresses=self.whois()
-        if addresses:
-            for adr in addresses:
-                if adr[0]==address:
-                    did=adr[1]
-                    return did
-
-    def declareDeviceFromId(self, did, poll=15, filterOutOfService=False, objectList=None):
+        """return the id of the device at the given address, from the directory (a unicast Who-Is is only sent if the device is unknown or expired)"""
+        did=self._directory.getId(address)
+        if did is None:
+            items=self.whois(str(address))
+            if items:
+                for item in items:
+                    if str(item[0])==str(address):
+                        return item[1]
+        return did
+
+    def declareDeviceFromId(self, did, poll=15, filterOutOfService=False, objectList=None, lazy=False):
         """declare a remote device specified by it's id (i.e 8015). Device address will be guessed from a whois() request."""
         address=self.getDeviceAddressFromId(did)
         if address:
-            return self.declareDevice(did, address, poll=poll, filterOutOfService=filterOutOfService, objectList=objectList)
+            return self.declareDevice(did, address, poll=poll, filterOutOfService=filterOutOfService, objectList=objectList, lazy=lazy)
 
-    def declareDeviceFromAddress(self, address, poll=15, filterOutOfService=False, objectList=None):
+    def declareDeviceFromAddress(self, address, poll=15, filterOutOfService=False, objectList=None, lazy=False):
         """declare a remote device specified by it's address (i.e '2001:3' or '192.168.0.84'). Device id will be guessed from a whois() request."""
         did=self.getDeviceIdFromAddress(address)
         if did:
-            return self.declareDevice(did, address, poll=poll, filterOutOfService=filterOutOfService, objectList=objectList)
+            return self.declareDevice(did, address, poll=poll, filterOutOfService=filterOutOfService, objectList=objectList, lazy=lazy)
 
     def __getitem__(self, key):
         """return any declared device from id, name or address"""
         return self.device(key)
 
-    def dump(self):
+    def dump(self, cached=False):
+        """dump the declared devices. Device properties come from each device's properties cache, a cold device costing
+        a single ReadPropertyMultiple request (no traffic at all with cached=True, unknown properties shown as '?')"""
         devices=self.devices()
         if devices:
             t=PrettyTable()
@@ -285,14 +513,27 @@ class BAC(object):
             t.align['model']='l'
             t.align['description']='l'
             for device in devices:
-                t.add_row([device.index, device.name, device.did, device.address,
-                           device.vendorName, device.modelName,
-                           device.description,
+                if cached:
+                    values=[device.cachedProperty(name) for name in ['objectName', 'vendorName', 'modelName', 'description']]
+                    values=['?' if value is None else value for value in values]
+                else:
+                    values=[device.name, device.vendorName, device.modelName, device.description]
+                t.add_row([device.index, values[0], device.did, device.address,
+                           values[1], values[2],
+                           values[3],
                            device.points.count()])
             print(t)
 
+    def export(self, path, keys=None, kind='snapshot', t0=None, t1=None, format=None, chunkSize=10000):
+        """stream the values ('snapshot') or the history samples between t0 and t1 ('history') of the points (matching keys)
+        of every declared device to a single CSV or Parquet file. Return the number of rows exported"""
+        with BACExporter(path, kind, format, chunkSize) as exporter:
+            for device in self.devices():
+                device.points.exportTo(exporter, keys, t0, t1)
+        return exporter.rowCount
+
     def __iter__(self):
-        return iter(self._devices.values())
+        return iter(self.devices())
 
 
 if __name__=='__main__':
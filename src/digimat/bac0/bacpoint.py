@@ -1,25 +1,127 @@
 #!/bin/python
 
 import datetime
+import time
 from prettytable import PrettyTable
 
 from digimat.units import Units
 
+from .bachistory import BACHistory
+
 import BAC0
 
 # BAC0.bacpypes.basetypes.EngineeringUnits
 
 digimatUnits=Units()
 
+# BACnet object type codes (ObjectTypesSupported)
+OBJECT_TYPES={'analogInput': 0, 'analogOutput': 1, 'analogValue': 2,
+              'binaryInput': 3, 'binaryOutput': 4, 'binaryValue': 5,
+              'multiStateInput': 13, 'multiStateOutput': 14, 'multiStateValue': 19}
+ANALOG_TYPES=frozenset([0, 1, 2])
+BINARY_TYPES=frozenset([3, 4, 5])
+MULTISTATE_TYPES=frozenset([13, 14, 19])
+
+
+class BACPriorityArray(object):
+    """Immutable snapshot of the priority array of a writable point, read once and shared by priority(), activePriority() and dump()
+    """
+    __slots__=('_entries', '_stamp')
+
+    def __init__(self, entries, stamp=None):
+        # 16 entries, each being None (relinquished) or a (value, valueType) tuple
+        entries=list(entries or [])[:16]
+        entries.extend([None]*(16-len(entries)))
+        self._entries=tuple(entries)
+        self._stamp=stamp or time.time()
+
+    @classmethod
+    def fromBacnet(cls, value):
+        """create a snapshot from a bacpypes PriorityArray (as read by BAC0)"""
+        try:
+            items=value.value[1:]
+        except:
+            items=list(value or [])
+        entries=[]
+        for item in items:
+            entry=None
+            try:
+                if item is not None:
+                    valueType, data=item.dict_contents().copy().popitem()
+                    if valueType!='null':
+                        entry=(data, valueType)
+            except:
+                pass
+            entries.append(entry)
+        return cls(entries)
+
+    def __repr__(self):
+        return '<%s(%s, %ds)>' % (self.__class__.__name__, str(self.levels()), self.age())
+
+    def age(self):
+        """return the age (seconds) of the snapshot"""
+        return time.time()-self._stamp
+
+    @property
+    def stamp(self):
+        return self._stamp
+
+    def isExpired(self, maxAge):
+        if maxAge is not None and self.age()>maxAge:
+            return True
+        return False
+
+    def priority(self, level):
+        """return the (value, valueType, level) of the given level (1..16), or None if relinquished"""
+        try:
+            entry=self._entries[int(level)-1]
+            if entry is not None:
+                return entry[0], entry[1], int(level)
+        except:
+            pass
+
+    def active(self):
+        """return the (value, valueType, level) of the highest active priority, or None"""
+        for level in range(1, 16+1):
+            p=self.priority(level)
+            if p:
+                return p
+
+    def levels(self):
+        """return the list of the occupied levels"""
+        return [n+1 for n, entry in enumerate(self._entries) if entry is not None]
+
+    def __iter__(self):
+        for level in self.levels():
+            yield self.priority(level)
+
 
 class BACPoint(object):
     """Represent BACnet's point of a BACDevice. Every BACPoint is stored in a parent's BACPoints object. BACPoint objects are created by the BACDevice object
     """
+    # identity fields (name, type, address, ...) are immutable and computed once at creation
+    __slots__=('_device', '_bac0point', '_index',
+               '_name', '_type', '_typeCode', '_address', '_descriptor', '_unitCode',
+               '_priorityArray', '_history')
+
     def __init__(self, device, bac0point, index=None):
         # assert(isinstance(device, BACDevice))
         self._device=device
         self._bac0point=bac0point
         self._index=index
+        properties=bac0point.properties
+        self._name=properties.name
+        self._type=properties.type
+        self._typeCode=OBJECT_TYPES.get(self._type, -1)
+        self._address=int(properties.address)
+        self._descriptor='%s%d' % (self._type, self._address)
+        self._unitCode=None
+        self._priorityArray=None
+        self._history=None
+        try:
+            self._unitCode=BAC0.bacpypes.basetypes.EngineeringUnits(bac0point.units).get_long()
+        except:
+            pass
         self._onInit()
 
     def _onInit(self):
@@ -41,6 +143,51 @@ class BACPoint(object):
         # to be overriden
         return None
 
+    def priorityArray(self, maxAge=None):
+        # to be overriden
+        return None
+
+    def invalidatePriorityArray(self):
+        """forget the priority array snapshot (it will be read again on next access)"""
+        self._priorityArray=None
+
+    def enableHistory(self, size=8640):
+        """start recording the point's values (BAC0 device polling, refresh, scheduler, COV) in a BACHistory ring buffer
+        of size samples (default to 24 hours of 10 seconds samples). Return the BACHistory object"""
+        if self._history is None or self._history.size!=int(size):
+            self._history=BACHistory(size)
+        # every new value of the BAC0 point goes through it's _trend() method, including the BAC0 device polling
+        self._bac0point._trend=self._trend
+        return self._history
+
+    def disableHistory(self):
+        self._history=None
+        try:
+            del self._bac0point._trend
+        except:
+            pass
+
+    def _trend(self, value):
+        """_trend() hook of the BAC0 point (installed while the history is enabled)"""
+        self._bac0point.__class__._trend(self._bac0point, value)
+        self._record(value)
+
+    @property
+    def history(self):
+        """the point's BACHistory object (None if history is not enabled)"""
+        return self._history
+
+    def _record(self, value, stamp=None):
+        history=self._history
+        if history is not None:
+            history.record(value, stamp)
+
+    @property
+    def device(self):
+        """reference to the parent's BACDevice object
+        """
+        return self._device
+
     @property
     def bac0point(self):
         """reference to the BAC0's point object
@@ -79,25 +226,64 @@ class BACPoint(object):
         except:
             pass
 
+    def cachedBacnetProperty(self, name):
+        """return the last known value of the bacnet property (no traffic)"""
+        try:
+            return self._bac0point.properties.bacnet_properties[name]
+        except:
+            pass
+
+    def cachedValue(self):
+        """return the last known presentValue (binary points giving 'active'/'inactive'), or None (no traffic)"""
+        try:
+            value=self._bac0point.lastValue
+            if type(value) is str and ':' in value:
+                return int(value.split(':')[0])
+            return value
+        except:
+            pass
+
+    def cachedDescription(self):
+        """return the description as known by BAC0 or the device cache, or None (no traffic)"""
+        description=getattr(self._bac0point.properties, 'description', None)
+        if description is None:
+            description=self._device.staticProperty(self._descriptor, 'description')
+        return description
+
+    def cachedLabel(self):
+        """return the label of the last known value, or None (no traffic)"""
+        return None
+
+    def cachedOutOfService(self):
+        """return the last known outOfService state (True/False), or None if unknown (no traffic)"""
+        value=self.cachedBacnetProperty('outOfService')
+        if value is not None:
+            return bool(value)
+
     @property
     def index(self):
         return self._index
 
     @property
     def name(self):
-        return self.properties.name
+        return self._name
 
     @property
     def type(self):
-        return self.properties.type
+        return self._type
+
+    @property
+    def typeCode(self):
+        """return the BACnet object type code (i.e. 0 for analogInput)"""
+        return self._typeCode
 
     @property
     def address(self):
-        return int(self.properties.address)
+        return self._address
 
     @property
     def descriptor(self):
-        return '%s%d' % (self.type, self.address)
+        return self._descriptor
 
     @property
     def description(self):
@@ -115,10 +301,7 @@ class BACPoint(object):
 
     @property
     def unitNumber(self):
-        try:
-            return BAC0.bacpypes.basetypes.EngineeringUnits(self.unit).get_long()
-        except:
-            pass
+        return self._unitCode
 
     def digUnit(self):
         if self.isMultiState():
@@ -151,19 +334,13 @@ class BACPoint(object):
         return 0
 
     def isBinary(self):
-        if 'binary' in self.type:
-            return True
-        return False
+        return self._typeCode in BINARY_TYPES
 
     def isAnalog(self):
-        if 'analog' in self.type:
-            return True
-        return False
+        return self._typeCode in ANALOG_TYPES
 
     def isMultiState(self):
-        if 'multiState' in self.type:
-            return True
-        return False
+        return self._typeCode in MULTISTATE_TYPES
 
     @property
     def value(self):
@@ -189,9 +366,9 @@ class BACPoint(object):
         except:
             pass
 
-    def strvalue(self):
-        """return the value expressed as a string (for display purposes)"""
-        value=self.value
+    def strvalue(self, cached=False):
+        """return the value (or the last known value if cached is True) expressed as a string (for display purposes)"""
+        value=self.cachedValue() if cached else self.value
         if type(value) is str:
             return value
         if type(value) is bool:
@@ -223,6 +400,11 @@ class BACPoint(object):
     def isAutoRefreshed(self):
         if self.isCOV() or self._device.isPolled():
             return True
+        try:
+            if self._device.parent.scheduler.isScheduled(self):
+                return True
+        except:
+            pass
 
     def cov(self, ttl=300):
         if ttl==0:
@@ -230,19 +412,75 @@ class BACPoint(object):
         else:
             if ttl<=0:
                 ttl=60
-            self._bac0point.subscribe_cov(confirmed=True, lifetime=ttl, callback=None)
+            with self._device.measure('subscribeCOV'):
+                self._bac0point.subscribe_cov(confirmed=True, lifetime=ttl, callback=self._onCOV)
+
+    def _onCOV(self, elements=None, *args, **kwargs):
+        """COV notification callback (called from the BAC0 thread), publishing the new value on the BAC's change stream"""
+        try:
+            value=elements['properties']['presentValue']
+        except:
+            return
+        try:
+            if self._bac0point.lastValue!=value:
+                # recorded by the _trend() hook
+                self._bac0point._trend(value)
+            else:
+                self._record(value)
+        except:
+            pass
+        try:
+            self._device.parent.changeStream.publish(self, value)
+        except:
+            pass
 
     def covCancel(self):
-        self._bac0point.cancel_cov()
+        with self._device.measure('subscribeCOV'):
+            self._bac0point.cancel_cov()
+
+    def _readProperty(self, prop):
+        with self._device.measure('readProperty'):
+            return self._bac0point.read_property(prop)
 
     def read(self, prop='presentValue'):
-        return self._bac0point.read_property(prop)
+        """read the property (concurrent reads of the same property share a single request)"""
+        return self._device.singleFlight((self._type, self._address, prop, None), self._readProperty, prop)
 
-    def refresh(self):
-        self.reloadBacnetProperties()
+    def refreshProperties(self):
+        """return the list of bacnet properties to be read to refresh this point"""
+        props=['presentValue', 'statusFlags', 'outOfService']
         if self.isWritable():
-            self.reloadPriorityArray()
-        self._bac0point.value
+            props.extend(['priorityArray', 'relinquishDefault'])
+        return props
+
+    def _update(self, values):
+        """update the BAC0 point's cached data with the given {property: value} (i.e. retrieved by a BACBatchReader)"""
+        for prop, value in values.items():
+            try:
+                if prop=='presentValue':
+                    # recorded by the _trend() hook
+                    self._bac0point._trend(value)
+                elif prop=='priorityArray':
+                    self._bac0point.properties.priority_array=value
+                    self._priorityArray=BACPriorityArray.fromBacnet(value)
+                else:
+                    # only update an already loaded properties cache (an empty one will trigger a full read by BAC0)
+                    properties=self._bac0point.properties.bacnet_properties
+                    if properties:
+                        properties[prop]=value
+            except:
+                pass
+
+    def _refresh(self):
+        reader=self._device.batchReader()
+        reader.addPoint(self)
+        reader.read()
+        return reader.requestCount
+
+    def refresh(self):
+        """refresh the point's value and properties (a single ReadPropertyMultiple request if supported by the device,
+        shared by concurrent refresh calls)"""
+        return self._device.singleFlight((self._type, self._address, 'refresh', None), self._refresh)
 
     def __repr__(self):
         svalue=str(self.value)
@@ -288,10 +526,8 @@ class BACPoint(object):
         t.add_row(['OutOfService', self.isOutOfService()])
         if self.isWritable():
             try:
-                for priority in range(1, 16+1):
-                    p=self.priority(priority)
-                    if p:
-                        t.add_row(['PriorityArray[%d]' % p[2], '%s:%s' % (p[1], str(p[0]))])
+                for p in self.priorityArray():
+                    t.add_row(['PriorityArray[%d]' % p[2], '%s:%s' % (p[1], str(p[0]))])
             except:
                 pass
             try:
@@ -329,49 +565,59 @@ class BACPoint(object):
 
 
 class BACPointInput(BACPoint):
-    pass
+    __slots__=()
 
 
 class BACPointWritable(BACPoint):
+    __slots__=()
+
     def isWritable(self):
         return True
 
     def write(self, value, prop='presentValue', priority=''):
         try:
-            if value=='null':
-                # relinquish
-                return self._bac0point.write(value, prop=prop)
-
-            value=self._normalizeValue(value)
-            return self._bac0point.write(value, prop=prop)
+            if value!='null':
+                value=self._normalizeValue(value)
+            # 'null' relinquish the priority
+            with self._device.measure('writeProperty'):
+                return self._bac0point.write(value, prop=prop, priority=priority)
         except:
             pass
+        finally:
+            # the priority array has probably changed
+            self._priorityArray=None
         return None
 
-    def reloadPriorityArray(self):
-        self._bac0point.read_priority_array()
-
-    def priority(self, priority=None):
-        if priority:
-            try:
-                # FIXME: This will trigger a read for every call!
-                # https://github.com/ChristianTremblay/BAC0/blob/master/BAC0/core/devices/Points.py
-                p=self._bac0point.priority(priority)
-                if p:
-                    # value, valueType, level
-                    return p[1], p[0], priority
-                return
-            except:
-                pass
+    # max age (seconds) of the priority array snapshot before it is read again
+    PRIORITY_ARRAY_MAX_AGE=15
 
-        for priority in range(1, 16+1):
-            try:
-                p=self.priority(priority)
-                if p:
-                    # value, valueType, level
-                    return p[1], p[0], priority
-            except:
-                pass
+    def reloadPriorityArray(self):
+        """read the priority array (a single read) and return the new BACPriorityArray snapshot"""
+        try:
+            value=self.read('priorityArray')
+            self._bac0point.properties.priority_array=value
+            self._priorityArray=BACPriorityArray.fromBacnet(value)
+        except:
+            self._priorityArray=None
+        return self._priorityArray
+
+    def priorityArray(self, maxAge=None):
+        """return the BACPriorityArray snapshot of the point, read again only if older than maxAge (default PRIORITY_ARRAY_MAX_AGE)"""
+        if maxAge is None:
+            maxAge=self.PRIORITY_ARRAY_MAX_AGE
+        snapshot=self._priorityArray
+        if snapshot is None or snapshot.isExpired(maxAge):
+            snapshot=self.reloadPriorityArray()
+        return snapshot
+
+    def priority(self, priority=None, maxAge=None):
+        """return the (value, valueType, level) of the given priority level, or of the active priority if no level is given.
+        Answered from the priority array snapshot (see priorityArray())"""
+        snapshot=self.priorityArray(maxAge)
+        if snapshot:
+            if priority:
+                return snapshot.priority(priority)
+            return snapshot.active()
 
     def relinquish(self, priority, reload=False):
         try:
@@ -383,9 +629,18 @@ class BACPointWritable(BACPoint):
             pass
 
     def relinquishAll(self):
-        for i in range(1, 16+1):
-            self.relinquish(i, reload=False)
-        self.reloadPriorityArray()
+        """relinquish every occupied priority level (one priority array read, then a single WritePropertyMultiple request
+        if supported by the device). Return the number of requests sent"""
+        snapshot=self.reloadPriorityArray()
+        levels=range(1, 16+1)
+        if snapshot:
+            levels=snapshot.levels()
+        writer=self._device.batchWriter()
+        for level in levels:
+            writer.add(self.type, self.address, 'presentValue', 'null', level)
+        writer.write()
+        self.invalidatePriorityArray()
+        return writer.requestCount+1
 
     @property
     def default(self):
@@ -397,20 +652,23 @@ class BACPointWritable(BACPoint):
     @default.setter
     def default(self, value):
         try:
-            self._bac0point.default(value)
+            with self._device.measure('writeProperty'):
+                self._bac0point.default(value)
         except:
             pass
 
 
 class BACPointOutput(BACPointWritable):
-    pass
+    __slots__=()
 
 
 class BACPointValue(BACPointWritable):
-    pass
+    __slots__=()
 
 
 class BACPointBinary(BACPoint):
+    __slots__=()
+
     def isBinary(self):
         return True
 
@@ -477,8 +735,24 @@ class BACPointBinary(BACPoint):
         except:
             pass
 
+    def cachedLabel(self):
+        try:
+            labels=[self.cachedBacnetProperty('inactiveText'), self.cachedBacnetProperty('activeText')]
+            if None in labels:
+                labels=self.properties.units_state
+            value=self.cachedValue()
+            if value is None:
+                return None
+            if value in ('active', 1, True):
+                return labels[1]
+            return labels[0]
+        except:
+            pass
+
 
 class BACPointAnalog(BACPoint):
+    __slots__=()
+
     def isBinary(self):
         return False
 
@@ -501,6 +775,8 @@ class BACPointAnalog(BACPoint):
 
 
 class BACPointMultiState(BACPoint):
+    __slots__=()
+
     def isBinary(self):
         return False
 
@@ -532,6 +808,10 @@ class BACPointMultiState(BACPoint):
         except:
             pass
 
+    def cachedLabel(self):
+        # multiState labels are loaded with the point
+        return self.label
+
     def valueFromLabel(self, label):
         try:
             return self.labels.index(label)+1
@@ -556,22 +836,24 @@ class BACPointMultiState(BACPoint):
 
 
 class BACPointAnalogInput(BACPointAnalog, BACPointInput):
-    pass
+    __slots__=()
 
 
 class BACPointAnalogOutput(BACPointAnalog, BACPointOutput):
-    pass
+    __slots__=()
 
 
 class BACPointAnalogValue(BACPointAnalog, BACPointValue):
-    pass
+    __slots__=()
 
 
 class BACPointBinaryInput(BACPointBinary, BACPointInput):
-    pass
+    __slots__=()
 
 
 class BACPointBinaryOutput(BACPointBinary, BACPointOutput):
+    __slots__=()
+
     def on(self):
         self.write('active')
 
@@ -586,6 +868,8 @@ class BACPointBinaryOutput(BACPointBinary, BACPointOutput):
 
 
 class BACPointBinaryValue(BACPointBinary, BACPointValue):
+    __slots__=()
+
     def on(self):
         self.write('active')
 
@@ -600,15 +884,15 @@ class BACPointBinaryValue(BACPointBinary, BACPointValue):
 
 
 class BACPointMultiStateInput(BACPointMultiState, BACPointInput):
-    pass
+    __slots__=()
 
 
 class BACPointMultiStateOutput(BACPointMultiState, BACPointOutput):
-    pass
+    __slots__=()
 
 
 class BACPointMultiStateValue(BACPointMultiState, BACPointValue):
-    pass
+    __slots__=()
 
 
 if __name__=='__main__':
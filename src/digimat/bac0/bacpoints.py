@@ -3,11 +3,14 @@
 import unicodedata
 import re
 import os
-from prettytable import PrettyTable
 
 # import BAC0
 
 from .bacpoint import BACPoint
+from .bacbatch import BACWriteReport
+from .bacexport import BACExporter
+from .bacsnapshot import BACSnapshot
+from .bactable import createTable, printTable
 
 
 class ObjectVariableMounter(object):
@@ -43,12 +46,125 @@ class ObjectVariableMounter(object):
             pass
 
 
+class BACPointsIndex(object):
+    """Trigram and attribute indexes of a BACPoints object, answering keyword queries without scanning every point.
+    A point matches a key when the key is part of it's name, description or type (case insensitive)
+    """
+    NGRAM=3
+
+    def __init__(self):
+        self._texts=[]
+        self._ngrams={}
+        self._types={}
+        self._units={}
+        self._writable=set()
+        self._outOfService=set()
+
+    def _str2keys(self, keys):
+        if keys:
+            return str(keys).lower().split()
+        return []
+
+    def ngrams(self, text):
+        return set(text[n:n+self.NGRAM] for n in range(len(text)-self.NGRAM+1))
+
+    def add(self, position, point):
+        try:
+            texts=(str(point.name or '').lower(), str(point.description or '').lower(), str(point.type or '').lower())
+        except:
+            texts=('', '', '')
+        self._texts.append(texts)
+        ngrams=set()
+        for text in texts:
+            ngrams.update(self.ngrams(text))
+        for ngram in ngrams:
+            self._ngrams.setdefault(ngram, set()).add(position)
+
+        self._types.setdefault(texts[2], set()).add(position)
+        try:
+            self._units.setdefault(str(point.unit).lower(), set()).add(position)
+        except:
+            pass
+        if point.isWritable():
+            self._writable.add(position)
+        self.setOutOfService(position, point.cachedBacnetProperty('outOfService'))
+
+    def setOutOfService(self, position, state):
+        if state:
+            self._outOfService.add(position)
+        else:
+            self._outOfService.discard(position)
+
+    def candidates(self, key):
+        """return the set of positions that may match the key, or None if the key is too short to be indexed"""
+        if len(key)<self.NGRAM:
+            return None
+        positions=None
+        for ngram in self.ngrams(key):
+            items=self._ngrams.get(ngram)
+            if not items:
+                return set()
+            if positions is None:
+                positions=set(items)
+            else:
+                positions&=items
+            if not positions:
+                break
+        return positions
+
+    def _isMatching(self, position, keys):
+        name, description, ptype=self._texts[position]
+        for key in keys:
+            if key not in name and key not in description and key not in ptype:
+                return False
+        return True
+
+    def select(self, keys=None, type=None, unit=None, writable=None, outOfService=None):
+        """return the sorted list of positions matching every keys and the given attribute filters"""
+        positions=None
+
+        def restrict(items):
+            if positions is None:
+                return set(items)
+            return positions & items
+
+        if type is not None:
+            positions=restrict(self._types.get(str(type).lower(), set()))
+        if unit is not None:
+            positions=restrict(self._units.get(str(unit).lower(), set()))
+        if writable is not None:
+            if writable:
+                positions=restrict(self._writable)
+            else:
+                positions=restrict(set(range(len(self._texts)))-self._writable)
+        if outOfService is not None:
+            if outOfService:
+                positions=restrict(self._outOfService)
+            else:
+                positions=restrict(set(range(len(self._texts)))-self._outOfService)
+
+        keys=self._str2keys(keys)
+        for key in sorted(keys, key=len, reverse=True):
+            items=self.candidates(key)
+            if items is not None:
+                positions=restrict(items)
+            if positions is not None and not positions:
+                return []
+
+        if positions is None:
+            positions=range(len(self._texts))
+        if keys:
+            return sorted(p for p in positions if self._isMatching(p, keys))
+        return sorted(positions)
+
+
 class BACPoints(object):
     def __init__(self, points=None):
         self._points=[]
         self._pointByName={}
         self._pointByDescriptor={}
         self._indexByName={}
+        self._pointsIndex=BACPointsIndex()
         self.add(points)
 
     def add(self, points):
@@ -63,10 +179,10 @@ class BACPoints(object):
 
         for point in points:
             assert(isinstance(point, BACPoint))
-            if self.getByDescriptor(point.descriptor):
+            if point.descriptor in self._pointByDescriptor:
                 # print("DEBUG: discarding", point)
                 continue
-            if self.getByName(point.name):
+            if point.name in self._pointByName:
                 continue
 
             index=len(self._points)
@@ -75,6 +191,7 @@ class BACPoints(object):
             self._pointByName[point.name]=point
             self._pointByDescriptor[point.descriptor]=point
             self._indexByName[point.name]=index
+            self._pointsIndex.add(index, point)
 
     def __iadd__(self, point):
         self.add(point)
@@ -86,18 +203,31 @@ class BACPoints(object):
 
     def pointsMatching(self, keys=None):
         if self._points:
-            return [p for p in self._points if p.match(keys)]
+            return self.match(keys)
 
     def match(self, keys):
-        return [p for p in self.points if p.match(keys)]
+        """return the points having each key (space separated) in their name, description or type"""
+        return [self._points[n] for n in self._pointsIndex.select(keys)]
 
     def matchFirst(self, keys):
-        for p in self._points:
-            if p.match(keys):
-                return p
+        positions=self._pointsIndex.select(keys)
+        if positions:
+            return self._points[positions[0]]
+
+    def select(self, keys=None, type=None, unit=None, writable=None, outOfService=None):
+        """return the points matching the keys (as match()) and the given filters,
+        i.e. select('sonde', type='analogInput', writable=False). outOfService uses the last known state (no traffic)"""
+        return [self._points[n] for n in self._pointsIndex.select(keys, type=type, unit=unit, writable=writable, outOfService=outOfService)]
+
+    def updateOutOfServiceIndex(self, points=None):
+        """update the out-of-service index from the last known state of the points (no traffic)"""
+        for point in (points or self._points):
+            index=self._indexByName.get(point.name)
+            if index is not None and self._points[index] is point:
+                self._pointsIndex.setOutOfService(index, point.cachedBacnetProperty('outOfService'))
 
     def type(self, objectType):
-        return [p for p in self.points if p.type==objectType]
+        return self.select(type=objectType)
 
     def analogInput(self, address):
         ptype='analogInput%d' % address
@@ -183,15 +313,31 @@ class BACPoints(object):
         except:
             pass
 
-    def dump(self, keys=None, filterOoS=False):
+    def _age(self, p, maxAge=None):
+        """return the age of the point's value for display, flagged with a '!' if older than maxAge"""
+        age=p.age()
+        if age is None:
+            return 'N/A'
+        if maxAge is not None and age>maxAge:
+            return '%ds!' % age
+        return '%ds' % age
+
+    def _unknown(self, value):
+        if value is None:
+            return '?'
+        return value
+
+    def dump(self, keys=None, filterOoS=False, cached=False, maxAge=None, fast=None, pager=False):
+        """dump the points (matching keys). With cached=True, only the cached data is used (no traffic) : unknown
+        fields are shown as '?' and ages older than maxAge seconds are flagged with a '!'. Big tables are rendered
+        with the fast plain text renderer (fast=None), optionally through the system pager"""
         if type(keys) is list:
             points=keys
         else:
             points=self.pointsMatching(keys)
         if points:
-            t=PrettyTable()
             # t.max_table_width=width=os.get_terminal_size()[0]-12
-            t.field_names=['#', 'name', 'description', 'descriptor', 'value', 'label', 'age', 'COV', 'OoS']
+            t=createTable(['#', 'name', 'description', 'descriptor', 'value', 'label', 'age', 'COV', 'OoS'], len(points), fast)
             t.align['name']='l'
             t.align['description']='l'
             t.align['descriptor']='l'
@@ -199,13 +345,27 @@ class BACPoints(object):
             t.align['label']='l'
             t.align['unit']='l'
             for p in points:
+                if cached:
+                    outOfService=p.cachedOutOfService()
+                    if filterOoS and outOfService:
+                        continue
+                    unit=p.digUnitStr() or p.unit or p.cachedLabel()
+                    value=p.cachedValue()
+                    t.add_row([self.index(p.name),
+                               p.name,
+                               self._unknown(p.cachedDescription()),
+                               p.descriptor,
+                               '?' if value is None else p.strvalue(True),
+                               unit,
+                               self._age(p, maxAge),
+                               'X' if p.isCOV() else '',
+                               '?' if outOfService is None else ('X' if outOfService else '')])
+                    continue
+
                 if filterOoS and p.isOutOfService():
                     continue
                 unit=p.unit
-                try:
-                    age='%ds' % p.age()
-                except:
-                    age='N/A'
+                age=self._age(p, maxAge)
 
                 if p.digUnitStr():
                     unit=p.digUnitStr()
@@ -221,46 +381,74 @@ class BACPoints(object):
                            age,
                            'X' if p.isCOV() else '',
                            'X' if p.isOutOfService() else ''])
-            print(t)
+            printTable(t, pager)
 
-    def quickDump(self, keys=None):
+    def quickDump(self, keys=None, maxAge=None, fast=None, pager=False):
+        """dump the points (matching keys) from the cached data only (no traffic)"""
         if type(keys) is list:
             points=keys
         else:
             points=self.pointsMatching(keys)
         if points:
-            t=PrettyTable()
-            t.field_names=['#', 'name', 'descriptor', 'value', 'age']
+            t=createTable(['#', 'name', 'descriptor', 'value', 'age'], len(points), fast)
             t.align['name']='l'
             t.align['descriptor']='l'
             t.align['value']='r'
             for p in points:
-                try:
-                    age='%ds' % p.age()
-                except:
-                    age='N/A'
+                value=p.cachedValue()
                 t.add_row([self.index(p.name),
                            p.name,
                            p.descriptor,
-                           p.strvalue(),
-                           age])
-            print(t)
+                           '?' if value is None else p.strvalue(True),
+                           self._age(p, maxAge)])
+            printTable(t, pager)
+
+    def snapshot(self, keys=None):
+        """return a BACSnapshot (columnar values, timestamps, ages, status flags and type codes) of the points
+        (matching keys), built from the cached data only (no traffic)"""
+        return BACSnapshot(self.match(keys))
+
+    def exportTo(self, exporter, keys=None, t0=None, t1=None):
+        """add the points (matching keys) to the given BACExporter"""
+        for point in self.match(keys):
+            exporter.add(point, t0, t1)
+
+    def export(self, path, keys=None, kind='snapshot', t0=None, t1=None, format=None, chunkSize=10000):
+        """stream the values ('snapshot') or the history samples between t0 and t1 ('history') of the points (matching keys)
+        to a CSV or Parquet file (see BACExporter). Return the number of rows exported"""
+        with BACExporter(path, kind, format, chunkSize) as exporter:
+            self.exportTo(exporter, keys, t0, t1)
+        return exporter.rowCount
 
     def refresh(self, keys=None):
+        """refresh points (matching keys), grouping reads of each device into ReadPropertyMultiple requests.
+        Return the number of requests sent"""
+        count=0
         points=self.match(keys)
-        if self._points:
-            for p in points:
-                p.refresh()
+        if points:
+            for device, items in self._groupByDevice(points).items():
+                reader=device.batchReader()
+                for p in items:
+                    reader.addPoint(p)
+                reader.read()
+                count+=reader.requestCount
+            self.updateOutOfServiceIndex(points)
+        return count
 
     def cov(self, ttl=300):
-        if self._points:
-            for p in self._points:
-                p.cov(ttl)
+        """subscribe COV on each point through the BAC's COV manager (renewing the subscriptions, points exceeding the device's
+        subscriptions budget being polled instead). Return the number of subscribed points"""
+        count=0
+        for device, points in self._groupByDevice(self._points).items():
+            if ttl==0:
+                device.parent.covManager.unsubscribe(points)
+            else:
+                count+=device.parent.covManager.subscribe(points, ttl)
+        return count
 
     def covCancel(self):
-        if self._points:
-            for p in self._points:
-                p.covCancel()
+        for device, points in self._groupByDevice(self._points).items():
+            device.parent.covManager.unsubscribe(points)
 
     def poll(self, delay=15):
         """Register a polling task for each point. Better do it directly on the device (and not on each device's points)"""
@@ -273,17 +461,145 @@ class BACPoints(object):
         for point in self._points:
             point.pollStop()
 
+    def schedule(self, rateClass='normal'):
+        """Register each point in the BAC's adaptive poll scheduler with the given rate class ('fast', 'normal', 'slow')"""
+        for device, points in self._groupByDevice(self._points).items():
+            device.parent.scheduler.add(points, rateClass)
+
+    def scheduleStop(self):
+        """Unregister each point from the BAC's adaptive poll scheduler"""
+        for device, points in self._groupByDevice(self._points).items():
+            device.parent.scheduler.remove(points)
+
+    def enableHistory(self, size=8640):
+        """enable the values history of each point (see BACPoint.enableHistory()). Return the number of bytes reserved"""
+        memory=0
+        for point in self._points:
+            memory+=point.enableHistory(size).memorySize()
+        return memory
+
+    def disableHistory(self):
+        for point in self._points:
+            point.disableHistory()
+
     def mountPointNamesAsVariables(self):
         """Create object variables mapped to each corresponding point's name"""
         mounter=ObjectVariableMounter(self)
         for point in self.points:
             mounter.mount(point)
 
-    def relinquishAll(self):
-        """Reset priority array of each writable objects"""
-        for point in self.points:
-            if point.isWritable():
-                point.relinquishAll()
+    def _groupByDevice(self, points):
+        devices={}
+        for point in points:
+            devices.setdefault(point.device, []).append(point)
+        return devices
+
+    def relinquishAll(self, window=4):
+        """Reset priority array of each writable objects. Priority arrays are read in batches, then only the occupied levels
+        are relinquished, with WritePropertyMultiple requests (or pipelined writes, at most window requests in flight).
+        Return the number of requests sent"""
+        count=0
+        for device, points in self._groupByDevice(self.select(writable=True)).items():
+            reader=device.batchReader()
+            for point in points:
+                reader.addPoint(point, ['priorityArray'])
+            reader.read()
+            count+=reader.requestCount
+
+            writer=device.batchWriter(window)
+            for point in points:
+                levels=range(1, 16+1)
+                snapshot=point.priorityArray()
+                if snapshot:
+                    levels=snapshot.levels()
+                for level in levels:
+                    writer.add(point.type, point.address, 'presentValue', 'null', level)
+            if writer.count()>0:
+                writer.write()
+                count+=writer.requestCount
+            for point in points:
+                point.invalidatePriorityArray()
+        return count
+
+
+class BACLazyPoints(BACPoints):
+    """BACPoints of a device declared in lazy mode : only the descriptors (type, instance) of the device's objects are
+    recorded, each BACPoint being created by the device on first access by index, name or descriptor.
+    Iterating, matching or dumping only concerns the already created points (see materializeAll()).
+    """
+    def __init__(self, device, descriptors=None):
+        self._device=device
+        self._descriptors=[]
+        self._descriptorIndex={}
+        super().__init__()
+        if descriptors:
+            for objectType, instance in descriptors:
+                descriptor='%s%d' % (objectType, instance)
+                if descriptor not in self._descriptorIndex:
+                    self._descriptorIndex[descriptor]=len(self._descriptors)
+                    self._descriptors.append((objectType, int(instance)))
+
+    def __repr__(self):
+        return '<%s(%d/%d points)>' % (self.__class__.__name__, len(self._points), len(self._descriptors))
+
+    def descriptors(self):
+        """return the list of (type, instance) of every declared point (created or not)"""
+        return list(self._descriptors)
+
+    def declaredCount(self):
+        return len(self._descriptors)
+
+    def isMaterialized(self, descriptor):
+        if super().getByDescriptor(descriptor):
+            return True
+        return False
+
+    def __getitem__(self, index):
+        # the descriptor is tried before the name : it only creates it's point, while resolving a name may read the
+        # objectName of every point of the device
+        item=self.getByIndex(index) or self.getByDescriptor(index) or self.getByName(index)
+        if not item:
+            try:
+                item=self.matchFirst(index)
+            except:
+                pass
+        return item
+
+    def getByIndex(self, index):
+        """search a point based on it's index in the device's object list"""
+        try:
+            objectType, instance=self._descriptors[int(index)]
+            return self.getByDescriptor('%s%d' % (objectType, instance))
+        except:
+            pass
+
+    def getByDescriptor(self, ptype):
+        """search a point based on it's descriptor (i.e analogInput98), creating it if needed"""
+        point=super().getByDescriptor(ptype)
+        if point is None:
+            try:
+                objectType, instance=self._descriptors[self._descriptorIndex[ptype]]
+                point=self._device._materializePoint(objectType, instance)
+            except:
+                pass
+        return point
+
+    def getByName(self, name):
+        """search a point based on it's name, creating it if needed"""
+        point=super().getByName(name)
+        if point is None:
+            try:
+                descriptor=self._device._lazyDescriptorFromName(name)
+                if descriptor:
+                    point=self.getByDescriptor(descriptor)
+            except:
+                pass
+        return point
+
+    def materializeAll(self):
+        """create every declared point of the device"""
+        for objectType, instance in self._descriptors:
+            self.getByDescriptor('%s%d' % (objectType, instance))
 
 
 class BACPointsBag(BACPoints):
@@ -305,6 +621,58 @@ class BACPointsBag(BACPoints):
             points=self.device.points.match(points)
         super().add(points=points)
 
+    def _resolve(self, key):
+        """return the point of the bag given by a BACPoint, or it's exact index, name or descriptor (no keyword matching)"""
+        if isinstance(key, BACPoint):
+            if self.getByDescriptor(key.descriptor) is key:
+                return key
+            return None
+        if type(key) is int:
+            if 0<=key<len(self._points):
+                return self._points[key]
+            return None
+        return self.getByName(key) or self.getByDescriptor(key)
+
+    def write(self, values, priority=None, prop='presentValue', window=4):
+        """write many values at once, given as a {point: value} dict or a list of (point, value) tuples (point being a BACPoint
+        of the bag, or it's exact index, name or descriptor, other keys being reported as unresolved). Writes are grouped by device into WritePropertyMultiple requests (or pipelined
+        single writes, with at most window requests in flight). When a point is given many times, only the last value is sent.
+        Return a BACWriteReport object"""
+        report=BACWriteReport()
+        if isinstance(values, dict):
+            values=values.items()
+
+        # coalesce writes to the same point
+        writes={}
+        for key, value in values:
+            point=self._resolve(key)
+            if point is None:
+                self.device.logger.warning('unable to write unknown point %s' % str(key))
+                report.setUnresolved(key, value)
+                continue
+            writes[point]=value
+
+        writable=[]
+        for point, value in writes.items():
+            if not point.isWritable():
+                report.set(point, value, 'point is not writable')
+                continue
+            writable.append(point)
+
+        for device, points in self._groupByDevice(writable).items():
+            writer=device.batchWriter(window)
+            for point in points:
+                value=writes[point]
+                if value!='null':
+                    value=point._normalizeValue(value)
+                writer.add(point.type, point.address, prop, value, priority, key=point)
+            results=writer.write()
+            report.addRequests(writer.requestCount)
+            for point in points:
+                report.set(point, writes[point], results.get(point, 'not written'))
+                point.invalidatePriorityArray()
+        return report
+
 
 if __name__ == "__main__":
     pass
@@ -0,0 +1,85 @@
+#!/bin/python
+
+import collections
+import concurrent.futures
+
+
+class BACNetworkPool(object):
+    """Worker pool running device tasks concurrently, with a concurrency limit for each BACnet network number.
+    Tasks aimed to devices behind a router (i.e. a MSTP trunk at 2001:3) are limited to very few outstanding
+    requests, while devices on the local BACnet/IP network (network 0) share a larger limit.
+    """
+    def __init__(self, workers=16, localLimit=8, remoteLimit=2, networkLimits=None):
+        self._workers=max(1, int(workers))
+        self._localLimit=max(1, int(localLimit))
+        self._remoteLimit=max(1, int(remoteLimit))
+        self._networkLimits=dict(networkLimits or {})
+
+    def __repr__(self):
+        return '<%s(%d workers, local=%d, remote=%d)>' % (self.__class__.__name__,
+            self._workers, self._localLimit, self._remoteLimit)
+
+    @staticmethod
+    def networkNumber(address):
+        """return the BACnet network number of an address (i.e 2001 for "2001:3"), 0 for a local (ip) address"""
+        try:
+            address=str(address)
+            if ':' in address and '.' not in address:
+                return int(address.split(':')[0])
+        except:
+            pass
+        return 0
+
+    def limit(self, network):
+        """return the max number of concurrent tasks allowed on the given network number"""
+        try:
+            return max(1, int(self._networkLimits[network]))
+        except:
+            pass
+        if network:
+            return self._remoteLimit
+        return self._localLimit
+
+    def setLimit(self, network, limit):
+        self._networkLimits[int(network)]=int(limit)
+
+    def run(self, tasks):
+        """execute the given tasks, a list of (address, function, args), and yield (task, result, error) tuples
+        as soon as each task is done. The number of concurrent tasks on each network is bounded by limit()
+        """
+        pending=collections.OrderedDict()
+        for task in tasks:
+            network=self.networkNumber(task[0])
+            pending.setdefault(network, collections.deque()).append(task)
+
+        running={}
+        active=collections.Counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self._workers) as executor:
+            while pending or running:
+                for network in list(pending.keys()):
+                    queue=pending[network]
+                    while queue and active[network]<self.limit(network) and len(running)<self._workers:
+                        task=queue.popleft()
+                        args=task[2] if len(task)>2 else ()
+                        future=executor.submit(task[1], *args)
+                        running[future]=(network, task)
+                        active[network]+=1
+                    if not queue:
+                        del pending[network]
+
+                if not running:
+                    break
+
+                done, _=concurrent.futures.wait(list(running.keys()), return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    network, task=running.pop(future)
+                    active[network]-=1
+                    try:
+                        result, error=future.result(), None
+                    except Exception as e:
+                        result, error=None, e
+                    yield task, result, error
+
+
+if __name__ == "__main__":
+    pass
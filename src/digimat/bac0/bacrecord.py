@@ -0,0 +1,238 @@
+#!/bin/python
+
+import time
+import json
+import gzip
+import base64
+import threading
+import collections
+
+from bacpypes.pdu import PDU
+from bacpypes.apdu import APDU
+from bacpypes.apdu import ComplexAckPDU, SimpleAckPDU, ErrorPDU, RejectPDU, AbortPDU
+from bacpypes.apdu import complex_ack_types, error_types
+
+
+def encodeAPDU(apdu):
+    """return the bytes of a confirmed request or response APDU (invokeID forced to 0, so that identical requests
+    have identical encodings). The segmentation parameters, only set by the application once the request is sent,
+    are forced to 0 too"""
+    data=APDU()
+    apdu.encode(data)
+    data.apduInvokeID=0
+    data.apduMaxSegs=0
+    data.apduMaxResp=0
+    pdu=PDU()
+    data.encode(pdu)
+    return bytes(pdu.pduData)
+
+
+def decodeResponse(data):
+    """return the response APDU (ack, error, reject or abort) decoded from it's bytes"""
+    apdu=APDU()
+    apdu.decode(PDU(data))
+    if apdu.apduType==ComplexAckPDU.pduType:
+        response=complex_ack_types[apdu.apduService]()
+    elif apdu.apduType==SimpleAckPDU.pduType:
+        response=SimpleAckPDU()
+    elif apdu.apduType==ErrorPDU.pduType:
+        response=error_types[apdu.apduService]()
+    elif apdu.apduType==RejectPDU.pduType:
+        response=RejectPDU()
+    elif apdu.apduType==AbortPDU.pduType:
+        response=AbortPDU()
+    else:
+        raise TypeError('unsupported response APDU type %d' % apdu.apduType)
+    response.decode(apdu)
+    return response
+
+
+class BACRecorder(object):
+    """Record every confirmed request sent by the BAC node (through the BAC0 application request_io) with it's
+    response (or error) and round trip time, into a compact capture file (gzip JSON lines, APDUs as base64).
+    The devices directory (id<->address) is saved with the capture. Should be created from the BAC object,
+    with something like bacnet.record(path)
+    """
+    def __init__(self, parent, path):
+        # assert(isinstance(parent, BAC))
+        self._parent=parent
+        self._path=path
+        self._file=None
+        self._lock=threading.Lock()
+        self._requestIO=None
+        self._t0=None
+        self._count=0
+
+    def __repr__(self):
+        return '<%s(%s, %d requests)>' % (self.__class__.__name__, self._path, self._count)
+
+    @property
+    def logger(self):
+        return self._parent.logger
+
+    @property
+    def count(self):
+        """number of recorded requests (readonly)"""
+        return self._count
+
+    def _write(self, item):
+        with self._lock:
+            if self._file is not None:
+                self._file.write(json.dumps(item)+'\n')
+                self._count+=1
+
+    def _record(self, iocb, stamp, address, request):
+        duration=time.time()-stamp
+        item={'t': round(stamp-self._t0, 6), 'address': address, 'request': request, 'rtt': round(duration, 6)}
+        try:
+            if iocb.ioError:
+                item['error']='%s %s' % (iocb.ioError.__class__.__name__, iocb.ioError)
+            else:
+                item['response']=base64.b64encode(encodeAPDU(iocb.ioResponse)).decode('ascii')
+        except Exception as e:
+            item['error']='%s %s' % (e.__class__.__name__, e)
+        self._write(item)
+
+    def _requestIOHook(self, iocb):
+        try:
+            request=iocb.args[0]
+            address=str(request.pduDestination)
+            data=base64.b64encode(encodeAPDU(request)).decode('ascii')
+            stamp=time.time()
+            iocb.add_callback(lambda iocb: self._record(iocb, stamp, address, data))
+        except:
+            self.logger.exception('unable to record request')
+        return self._requestIO(iocb)
+
+    def start(self):
+        if self._file is None:
+            application=self._parent.bac0.this_application
+            self._file=gzip.open(self._path, 'wt', encoding='ascii')
+            self._t0=time.time()
+            directory={str(did): str(address) for address, did in self._parent.directory.items()}
+            self._file.write(json.dumps({'capture': 1, 'stamp': self._t0, 'directory': directory})+'\n')
+            self._requestIO=application.request_io
+            application.request_io=self._requestIOHook
+            self.logger.info('recording requests to %s' % self._path)
+        return self
+
+    def stop(self):
+        if self._file is not None:
+            self._parent.bac0.this_application.request_io=self._requestIO
+            with self._lock:
+                self._file.close()
+                self._file=None
+            self.logger.info('%d requests recorded to %s' % (self._count, self._path))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+class BACReplay(object):
+    """Replace the BAC0 network layer (the application request_io) by the responses of a capture recorded by
+    BACRecorder. Identical requests (same device address and encoded APDU) are answered with their recorded responses
+    in capture order (the last one being reused). Responses are given immediately (timeScale=0, deterministic) or after
+    their recorded round trip time multiplied by timeScale. Requests missing from the capture fail as timeouts.
+    Should be created from the BAC object, with something like bacnet.replay(path)
+    """
+    def __init__(self, parent, path, timeScale=0.0):
+        # assert(isinstance(parent, BAC))
+        self._parent=parent
+        self._path=path
+        self._timeScale=float(timeScale)
+        self._responses=collections.defaultdict(collections.deque)
+        self._directory={}
+        self._requestIO=None
+        self._lock=threading.Lock()
+        self._hitCount=0
+        self._missCount=0
+        self.load()
+
+    def __repr__(self):
+        return '<%s(%s, %d hits, %d misses)>' % (self.__class__.__name__, self._path, self._hitCount, self._missCount)
+
+    @property
+    def logger(self):
+        return self._parent.logger
+
+    @property
+    def hitCount(self):
+        """number of requests answered from the capture (readonly)"""
+        return self._hitCount
+
+    @property
+    def missCount(self):
+        """number of requests not found in the capture (readonly)"""
+        return self._missCount
+
+    def load(self):
+        with gzip.open(self._path, 'rt', encoding='ascii') as f:
+            for line in f:
+                item=json.loads(line)
+                if 'capture' in item:
+                    self._directory.update(item.get('directory', {}))
+                    continue
+                self._responses[(item['address'], item['request'])].append(item)
+
+    def _complete(self, iocb, item):
+        try:
+            if 'response' in item:
+                iocb.complete(decodeResponse(base64.b64decode(item['response'])))
+            else:
+                iocb.abort(RuntimeError(item.get('error')))
+        except Exception as e:
+            iocb.abort(e)
+
+    def _requestIOHook(self, iocb):
+        item=None
+        try:
+            request=iocb.args[0]
+            key=(str(request.pduDestination), base64.b64encode(encodeAPDU(request)).decode('ascii'))
+            with self._lock:
+                items=self._responses.get(key)
+                if items:
+                    item=items[0]
+                    if len(items)>1:
+                        items.popleft()
+                    self._hitCount+=1
+                else:
+                    self._missCount+=1
+        except:
+            self.logger.exception('unable to replay request')
+
+        if item is None:
+            iocb.abort(RuntimeError('noResponse (not in capture)'))
+        elif self._timeScale>0:
+            timer=threading.Timer(item['rtt']*self._timeScale, self._complete, (iocb, item))
+            timer.daemon=True
+            timer.start()
+        else:
+            self._complete(iocb, item)
+
+    def start(self):
+        if self._requestIO is None:
+            for did, address in self._directory.items():
+                self._parent.directory.update(int(did), address)
+            application=self._parent.bac0.this_application
+            self._requestIO=application.request_io
+            application.request_io=self._requestIOHook
+            self.logger.info('replaying requests from %s' % self._path)
+        return self
+
+    def stop(self):
+        if self._requestIO is not None:
+            self._parent.bac0.this_application.request_io=self._requestIO
+            self._requestIO=None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+if __name__ == "__main__":
+    pass
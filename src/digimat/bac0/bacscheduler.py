@@ -0,0 +1,294 @@
+#!/bin/python
+
+import time
+import heapq
+import threading
+import collections
+
+from prettytable import PrettyTable
+
+from .bacpool import BACNetworkPool
+
+
+class BACPollEntry(object):
+    """A point registered in a BACPollScheduler, with it's rate class, actual (adaptive) interval and next deadline"""
+    __slots__=('_point', '_rateClass', '_minInterval', '_maxInterval', '_interval', '_due', '_lastValue', '_readCount', '_changeCount')
+
+    def __init__(self, point, rateClass, minInterval, maxInterval):
+        self._point=point
+        self._rateClass=rateClass
+        self._minInterval=float(minInterval)
+        self._maxInterval=float(maxInterval)
+        self._interval=self._minInterval
+        self._due=time.time()
+        self._lastValue=None
+        self._readCount=0
+        self._changeCount=0
+
+    def __repr__(self):
+        return '<%s(%s, %s, %.1fs)>' % (self.__class__.__name__, self._point.descriptor, self._rateClass, self._interval)
+
+    @property
+    def point(self):
+        return self._point
+
+    @property
+    def rateClass(self):
+        return self._rateClass
+
+    @property
+    def interval(self):
+        """actual polling interval (seconds)"""
+        return self._interval
+
+    @property
+    def due(self):
+        return self._due
+
+    def changeRate(self):
+        """return the ratio of reads that returned a new value"""
+        if self._readCount:
+            return float(self._changeCount)/self._readCount
+        return 0.0
+
+    def adapt(self, value, stamp=None):
+        """adapt the interval to the new read value (faster when the value changes, slower when it doesn't) and set the next deadline"""
+        self._readCount+=1
+        if self._readCount>1 and value!=self._lastValue:
+            self._changeCount+=1
+            self._interval=max(self._minInterval, self._interval/2.0)
+        else:
+            self._interval=min(self._maxInterval, self._interval*1.5)
+        self._lastValue=value
+        self._due=(stamp or time.time())+self._interval
+
+
+class BACPollScheduler(object):
+    """Deadline based polling scheduler of a BAC object. Each point has a rate class giving it's interval bounds,
+    the interval adapting itself to how often the value actually changes. On each tick, the due points are packed
+    into batched (RPM) reads, within a requests budget per device and per BACnet network (each point of a device without
+    RPM support costing a read per polled property). The devices are read concurrently on a BACNetworkPool, a device
+    still being read (i.e. timeouts) being skipped by the next ticks instead of delaying the other devices.
+    Should be used through the BAC object (bacnet.scheduler)
+    """
+    # (minInterval, maxInterval) in seconds
+    RATE_CLASSES={'fast': (5, 30), 'normal': (15, 120), 'slow': (60, 900)}
+    POLL_PROPERTIES=['presentValue', 'statusFlags']
+
+    def __init__(self, parent, tick=1.0, deviceBudget=2, networkBudget=4, localNetworkBudget=32, workers=16, localLimit=16, remoteLimit=2):
+        # assert(isinstance(parent, BAC))
+        self._parent=parent
+        self._tick=tick
+        # max number of requests sent on each tick, per device and per network number
+        self._deviceBudget=max(1, int(deviceBudget))
+        self._networkBudget=max(1, int(networkBudget))
+        self._localNetworkBudget=max(1, int(localNetworkBudget))
+        # max number of devices read concurrently, per network number
+        self._pool=BACNetworkPool(workers=workers, localLimit=localLimit, remoteLimit=remoteLimit)
+        # devices being read
+        self._busy=set()
+        self._entries={}
+        self._queue=[]
+        self._sequence=0
+        self._lock=threading.RLock()
+        self._thread=None
+        self._eventStop=threading.Event()
+        self._requestCount=0
+
+    def __repr__(self):
+        return '<%s(%d points, %d requests)>' % (self.__class__.__name__, len(self._entries), self._requestCount)
+
+    @property
+    def logger(self):
+        return self._parent.logger
+
+    @property
+    def requestCount(self):
+        """total number of requests sent by the scheduler (readonly)"""
+        return self._requestCount
+
+    def _push(self, entry):
+        self._sequence+=1
+        heapq.heappush(self._queue, (entry.due, self._sequence, entry))
+
+    def add(self, points, rateClass='normal'):
+        """register the point (or list of points) with the given rate class ('fast', 'normal', 'slow')"""
+        if rateClass not in self.RATE_CLASSES:
+            raise ValueError('unknown rate class %s' % rateClass)
+        if type(points) is not list:
+            points=[points]
+        minInterval, maxInterval=self.RATE_CLASSES[rateClass]
+        with self._lock:
+            for point in points:
+                entry=BACPollEntry(point, rateClass, minInterval, maxInterval)
+                self._entries[point]=entry
+                self._push(entry)
+        self.start()
+
+    def remove(self, points):
+        if type(points) is not list:
+            points=[points]
+        with self._lock:
+            for point in points:
+                self._entries.pop(point, None)
+
+    def removeDevice(self, device):
+        with self._lock:
+            self.remove([point for point in self._entries.keys() if point.device is device])
+
+    def isScheduled(self, point):
+        return point in self._entries
+
+    def entry(self, point):
+        return self._entries.get(point)
+
+    def entries(self):
+        with self._lock:
+            return list(self._entries.values())
+
+    def _objectsPerRequest(self, device):
+        reader=device.batchReader()
+        return max(1, int(reader.maxRequestSize()/reader.estimateSize(self.POLL_PROPERTIES)))
+
+    def _dueEntries(self, now):
+        """pop the due entries from the queue, within the requests budgets, grouped by device"""
+        devices=collections.OrderedDict()
+        deviceRequests=collections.Counter()
+        networkRequests=collections.Counter()
+        capacity={}
+        postponed=[]
+        while self._queue and self._queue[0][0]<=now:
+            due, sequence, entry=heapq.heappop(self._queue)
+            if self._entries.get(entry.point) is not entry or due!=entry.due:
+                # removed or rescheduled
+                continue
+            device=entry.point.device
+            if device in self._busy:
+                # still being read by a previous tick
+                postponed.append(entry)
+                continue
+            if not device.isAvailable():
+                # quarantined device (circuit breaker open), no request until it's next probe
+                entry._due=max(now+self._tick, device.breaker.nextProbe())
+                postponed.append(entry)
+                continue
+            network=BACNetworkPool.networkNumber(device.address)
+            budget=self._networkBudget if network else self._localNetworkBudget
+            items=devices.setdefault(device, [])
+            if device not in capacity:
+                # objects per RPM request, or None if each object needs a single read per property
+                capacity[device]=self._objectsPerRequest(device) if device.isRPMSupported() is not False else None
+            if capacity[device] is None:
+                cost=len(self.POLL_PROPERTIES)
+            elif len(items)%capacity[device]==0:
+                # this point needs a new request
+                cost=1
+            else:
+                cost=0
+            if cost:
+                # at least one point per device and per network on each tick, whatever it's cost
+                if (deviceRequests[device] and deviceRequests[device]+cost>self._deviceBudget) or \
+                        (networkRequests[network] and networkRequests[network]+cost>budget):
+                    postponed.append(entry)
+                    continue
+                deviceRequests[device]+=cost
+                networkRequests[network]+=cost
+            items.append(entry)
+
+        for entry in postponed:
+            # keep their deadline (or the probe time of their device), served on the next ticks
+            self._push(entry)
+        return devices
+
+    def _pollDevice(self, device, entries):
+        """pool task : read the due points of the device, then release the device for the next ticks"""
+        try:
+            return self._readDevice(device, entries)
+        finally:
+            with self._lock:
+                self._busy.discard(device)
+
+    def _readDevice(self, device, entries):
+        """read the due points of the device (batched) and reschedule them. Return the number of requests sent"""
+        count=0
+        try:
+            reader=device.batchReader()
+            for entry in entries:
+                reader.addPoint(entry.point, self.POLL_PROPERTIES)
+            results=reader.read()
+            count=reader.requestCount
+        except:
+            self.logger.exception('unable to poll device %d' % device.did)
+            results={}
+        now=time.time()
+        with self._lock:
+            self._requestCount+=count
+            for entry in entries:
+                if self._entries.get(entry.point) is not entry:
+                    continue
+                values=results.get((entry.point.type, entry.point.address))
+                if values and 'presentValue' in values:
+                    entry.adapt(values['presentValue'], now)
+                else:
+                    # no answer, retry at the max interval of the point
+                    entry._due=now+entry._maxInterval
+                self._push(entry)
+        return count
+
+    def _pollDevices(self, devices):
+        count=0
+        tasks=[(device.address, self._pollDevice, (device, entries)) for device, entries in devices.items()]
+        for task, result, error in self._pool.run(tasks):
+            if error is None:
+                count+=result
+        return count
+
+    def tick(self, wait=True):
+        """read the due points (batched by device, devices being read concurrently) and reschedule them. Return the
+        number of requests sent. With wait=False, the reads are done in background (return 0)"""
+        with self._lock:
+            devices=self._dueEntries(time.time())
+            devices=collections.OrderedDict((device, entries) for device, entries in devices.items() if entries)
+            self._busy.update(devices.keys())
+        if not devices:
+            return 0
+        if wait:
+            return self._pollDevices(devices)
+        threading.Thread(target=self._pollDevices, args=(devices,), name='BACPollScheduler', daemon=True).start()
+        return 0
+
+    def _manager(self):
+        while not self._eventStop.is_set():
+            try:
+                self.tick(wait=False)
+            except:
+                self.logger.exception('poll scheduler error')
+            self._eventStop.wait(self._tick)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._eventStop.clear()
+                self._thread=threading.Thread(target=self._manager, name='BACPollScheduler', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._eventStop.set()
+
+    def dump(self):
+        t=PrettyTable()
+        t.field_names=['device', 'descriptor', 'class', 'interval', 'changes', 'due']
+        t.align['descriptor']='l'
+        t.align['class']='l'
+        t.align['interval']='r'
+        t.align['changes']='r'
+        t.align['due']='r'
+        now=time.time()
+        for entry in self.entries():
+            t.add_row([entry.point.device.did, entry.point.descriptor, entry.rateClass,
+                       '%.1fs' % entry.interval, '%d%%' % (entry.changeRate()*100), '%ds' % (entry.due-now)])
+        print(t)
+
+
+if __name__ == "__main__":
+    pass
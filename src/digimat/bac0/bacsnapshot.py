@@ -0,0 +1,131 @@
+#!/bin/python
+
+import time
+import array
+
+try:
+    import numpy
+except ImportError:
+    numpy=None
+
+from .bachistory import BACHistory
+
+
+class BACSnapshot(object):
+    """Columnar snapshot of the cached state of some points, built in a single pass without any BACnet traffic.
+    Columns are numpy arrays (or array.array if numpy is not installed), one item per point :
+    values (float64, NaN if unknown), stamps (float64, seconds since epoch, NaN if unknown), ages (float64 seconds),
+    statusFlags (uint8 bitmask, see FLAG_*) and typeCodes (int16 BACnet object type codes).
+    Should be created with something like device.snapshot() or bag.snapshot()
+    """
+    FLAG_IN_ALARM=1
+    FLAG_FAULT=2
+    FLAG_OVERRIDDEN=4
+    FLAG_OUT_OF_SERVICE=8
+
+    def __init__(self, points):
+        self._points=list(points or [])
+        self._stamp=time.time()
+        nan=float('nan')
+        count=len(self._points)
+        values=array.array('d', [nan])*count
+        stamps=array.array('d', [nan])*count
+        flags=array.array('B', [0])*count
+        codes=array.array('h', [-1])*count
+        for n, point in enumerate(self._points):
+            bac0point=point.bac0point
+            codes[n]=point.typeCode
+            try:
+                value=BACHistory.toFloat(bac0point.lastValue)
+                if value is not None:
+                    values[n]=value
+                stamps[n]=bac0point.lastTimestamp.timestamp()
+            except:
+                pass
+            flags[n]=self._flags(point)
+
+        if numpy is not None:
+            self._values=numpy.frombuffer(values, dtype=numpy.float64)
+            self._stamps=numpy.frombuffer(stamps, dtype=numpy.float64)
+            self._statusFlags=numpy.frombuffer(flags, dtype=numpy.uint8)
+            self._typeCodes=numpy.frombuffer(codes, dtype=numpy.int16)
+            self._ages=self._stamp-self._stamps
+        else:
+            self._values=values
+            self._stamps=stamps
+            self._statusFlags=flags
+            self._typeCodes=codes
+            self._ages=array.array('d', [self._stamp-stamp for stamp in stamps])
+
+    def _flags(self, point):
+        """return the statusFlags bitmask from the cached bacnet properties of the point"""
+        flags=0
+        try:
+            status=point.cachedBacnetProperty('statusFlags')
+            if status is not None:
+                status=getattr(status, 'value', status)
+                for n, bit in enumerate(list(status)[:4]):
+                    if bit:
+                        flags|=(1 << n)
+        except:
+            pass
+        if point.cachedBacnetProperty('outOfService'):
+            flags|=self.FLAG_OUT_OF_SERVICE
+        return flags
+
+    def __repr__(self):
+        return '<%s(%d points, %s)>' % (self.__class__.__name__, len(self._points),
+            'numpy' if numpy is not None else 'array')
+
+    @property
+    def stamp(self):
+        """timestamp (seconds since epoch) of the snapshot"""
+        return self._stamp
+
+    @property
+    def points(self):
+        return self._points
+
+    @property
+    def descriptors(self):
+        return [point.descriptor for point in self._points]
+
+    @property
+    def values(self):
+        return self._values
+
+    @property
+    def stamps(self):
+        return self._stamps
+
+    @property
+    def ages(self):
+        return self._ages
+
+    @property
+    def statusFlags(self):
+        return self._statusFlags
+
+    @property
+    def typeCodes(self):
+        return self._typeCodes
+
+    def count(self):
+        return len(self._points)
+
+    def __len__(self):
+        return self.count()
+
+    def asdict(self):
+        """return the columns as a dict (i.e. for pandas.DataFrame(snapshot.asdict()))"""
+        return {'did': [point.device.did for point in self._points],
+                'descriptor': self.descriptors,
+                'value': self._values,
+                'stamp': self._stamps,
+                'age': self._ages,
+                'statusFlags': self._statusFlags,
+                'typeCode': self._typeCodes}
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,220 @@
+#!/bin/python
+
+import time
+import threading
+import collections
+
+
+class BACChangeEvent(object):
+    """A value change of a point (device, descriptor, value, timestamp), as pushed by a COV notification"""
+    __slots__=('_point', '_value', '_stamp')
+
+    def __init__(self, point, value, stamp=None):
+        self._point=point
+        self._value=value
+        self._stamp=stamp or time.time()
+
+    def __repr__(self):
+        return '<%s(%d:%s=%s)>' % (self.__class__.__name__, self.did, self.descriptor, str(self._value))
+
+    @property
+    def point(self):
+        return self._point
+
+    @property
+    def device(self):
+        return self._point.device
+
+    @property
+    def did(self):
+        return self._point.device.did
+
+    @property
+    def descriptor(self):
+        return self._point.descriptor
+
+    @property
+    def value(self):
+        return self._value
+
+    @property
+    def stamp(self):
+        """timestamp (seconds since epoch) of the change"""
+        return self._stamp
+
+    def astuple(self):
+        return (self.device, self.descriptor, self._value, self._stamp)
+
+
+class BACChangeConsumer(object):
+    """Bounded queue of the BACChangeEvent objects of a BACChangeStream accepted by it's filter. When the queue is full,
+    the overflow policy either drops the oldest event ('dropOldest', default), drops the new event ('dropNewest')
+    or waits at most blockTimeout seconds for room ('block') before dropping the new event. As events are pushed from
+    the BAC0 thread, a consumer never blocks it longer than blockTimeout.
+    The consumer is iterable (blocking until the next event, or until the consumer is closed)
+    """
+    DROP_OLDEST='dropOldest'
+    DROP_NEWEST='dropNewest'
+    BLOCK='block'
+
+    def __init__(self, stream, filter=None, maxsize=1000, overflow='dropOldest', blockTimeout=0.1):
+        self._stream=stream
+        self._filter=filter
+        self._maxsize=max(1, int(maxsize))
+        if overflow not in (self.DROP_OLDEST, self.DROP_NEWEST, self.BLOCK):
+            raise ValueError('unknown overflow policy %s' % overflow)
+        self._overflow=overflow
+        self._blockTimeout=blockTimeout
+        self._queue=collections.deque()
+        self._lock=threading.Condition()
+        self._droppedCount=0
+        self._closed=False
+
+    def __repr__(self):
+        return '<%s(%d/%d events, %d dropped, %s)>' % (self.__class__.__name__,
+            len(self._queue), self._maxsize, self._droppedCount, self._overflow)
+
+    @property
+    def droppedCount(self):
+        """number of events dropped by the overflow policy (readonly)"""
+        return self._droppedCount
+
+    def accept(self, event):
+        if self._filter is None:
+            return True
+        try:
+            return self._filter(event)
+        except:
+            pass
+        return False
+
+    def put(self, event):
+        with self._lock:
+            if self._closed:
+                return False
+            if len(self._queue)>=self._maxsize:
+                if self._overflow==self.DROP_OLDEST:
+                    self._queue.popleft()
+                    self._droppedCount+=1
+                elif self._overflow==self.BLOCK:
+                    self._lock.wait_for(lambda: len(self._queue)<self._maxsize or self._closed, self._blockTimeout)
+                if len(self._queue)>=self._maxsize or self._closed:
+                    self._droppedCount+=1
+                    return False
+            self._queue.append(event)
+            self._lock.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """return the next event (waiting at most timeout seconds), or None"""
+        with self._lock:
+            if not self._lock.wait_for(lambda: self._queue or self._closed, timeout):
+                return None
+            if self._queue:
+                event=self._queue.popleft()
+                self._lock.notify_all()
+                return event
+
+    def getAll(self):
+        """return (and remove) every queued event, without waiting"""
+        with self._lock:
+            events=list(self._queue)
+            self._queue.clear()
+            self._lock.notify_all()
+            return events
+
+    def count(self):
+        return len(self._queue)
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        while True:
+            event=self.get()
+            if event is None:
+                return
+            yield event
+
+    def close(self):
+        """detach the consumer from it's stream (pending iterators will stop)"""
+        self._stream.remove(self)
+        with self._lock:
+            self._closed=True
+            self._lock.notify_all()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class BACChangeStream(object):
+    """Stream of the point's value changes, fed by COV notifications and dispatched to every BACChangeConsumer.
+    Should be used through the BAC object (bacnet.changes(...))
+    """
+    def __init__(self):
+        self._consumers=[]
+        self._lock=threading.Lock()
+        self._eventCount=0
+
+    def __repr__(self):
+        return '<%s(%d consumers, %d events)>' % (self.__class__.__name__, len(self._consumers), self._eventCount)
+
+    def consumer(self, filter=None, did=None, descriptors=None, maxsize=1000, overflow='dropOldest', blockTimeout=0.1):
+        """create a new consumer receiving the events accepted by the filter function, or the events of the given
+        device id(s) and/or point descriptor(s)"""
+        if filter is None and (did is not None or descriptors is not None):
+            dids=did
+            if dids is not None and type(dids) not in (list, tuple, set):
+                dids=[dids]
+            if dids is not None:
+                dids=set(int(d) for d in dids)
+            if descriptors is not None and type(descriptors) not in (list, tuple, set):
+                descriptors=[descriptors]
+            if descriptors is not None:
+                descriptors=set(descriptors)
+
+            def filter(event):
+                if dids is not None and event.did not in dids:
+                    return False
+                if descriptors is not None and event.descriptor not in descriptors:
+                    return False
+                return True
+
+        return self.add(BACChangeConsumer(self, filter=filter, maxsize=maxsize, overflow=overflow, blockTimeout=blockTimeout))
+
+    def add(self, consumer):
+        """attach an already created consumer (i.e. a BACChangeConsumer subclass) to the stream"""
+        with self._lock:
+            self._consumers.append(consumer)
+        return consumer
+
+    def remove(self, consumer):
+        with self._lock:
+            try:
+                self._consumers.remove(consumer)
+            except:
+                pass
+
+    def publish(self, point, value, stamp=None):
+        """dispatch the value change of the point to the consumers accepting it"""
+        with self._lock:
+            consumers=list(self._consumers)
+        if consumers:
+            self._eventCount+=1
+            event=BACChangeEvent(point, value, stamp)
+            for consumer in consumers:
+                if consumer.accept(event):
+                    consumer.put(event)
+
+    def count(self):
+        return len(self._consumers)
+
+    def __len__(self):
+        return self.count()
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,73 @@
+#!/bin/python
+
+import pydoc
+
+from prettytable import PrettyTable
+
+# tables with more rows are rendered with BACTextTable by default
+FAST_TABLE_ROWS=1000
+
+
+class BACTextTable(object):
+    """Minimal plain text table, a fast replacement of PrettyTable for tables of many rows (same field_names, align,
+    add_row() interface). Column widths are computed in one pass over the rows, without any per cell formatting object.
+    """
+    def __init__(self, field_names=None):
+        self.field_names=list(field_names or [])
+        self.align={}
+        self._rows=[]
+
+    def add_row(self, row):
+        self._rows.append(['' if item is None else str(item) for item in row])
+
+    def count(self):
+        return len(self._rows)
+
+    def __len__(self):
+        return self.count()
+
+    def lines(self):
+        """generate the table text lines"""
+        widths=[len(str(name)) for name in self.field_names]
+        for row in self._rows:
+            for n, item in enumerate(row):
+                if len(item)>widths[n]:
+                    widths[n]=len(item)
+        justify=[str.rjust if self.align.get(name)=='r' else str.ljust for name in self.field_names]
+        separator='+' + '+'.join(['-'*(width+2) for width in widths]) + '+'
+        yield separator
+        yield '| ' + ' | '.join([str(name).center(widths[n]) for n, name in enumerate(self.field_names)]) + ' |'
+        yield separator
+        for row in self._rows:
+            yield '| ' + ' | '.join([justify[n](item, widths[n]) for n, item in enumerate(row)]) + ' |'
+        yield separator
+
+    def get_string(self):
+        return '\n'.join(self.lines())
+
+    def __str__(self):
+        return self.get_string()
+
+
+def createTable(field_names, rows=0, fast=None):
+    """return a PrettyTable, or a BACTextTable if fast is True (or if fast is None and the table has more than
+    FAST_TABLE_ROWS rows)"""
+    if fast is None:
+        fast=rows>FAST_TABLE_ROWS
+    if fast:
+        return BACTextTable(field_names)
+    t=PrettyTable()
+    t.field_names=field_names
+    return t
+
+
+def printTable(table, pager=False):
+    """print the table, through the system pager (i.e. less) if pager is True"""
+    if pager:
+        pydoc.pager(table.get_string())
+    else:
+        print(table)
+
+
+if __name__ == "__main__":
+    pass
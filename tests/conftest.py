@@ -0,0 +1,121 @@
+import logging
+
+import pytest
+
+import BAC0
+
+from BAC0.core.io.Read import ReadProperty
+
+from digimat.bac0.bacdevice import BACDevice
+from digimat.bac0.bacdirectory import BACDeviceDirectory
+from digimat.bac0.bacflight import BACSingleFlight
+from digimat.bac0.bacmetrics import BACMetrics
+from digimat.bac0.bacbreaker import BACDeviceWatchdog
+from digimat.bac0.bacscheduler import BACPollScheduler
+
+
+class FakeBAC0Properties(object):
+    def __init__(self, pollDelay):
+        self.pollDelay=pollDelay
+
+
+class FakeBAC0Device(object):
+    """BAC0 device without any network traffic"""
+    def __init__(self, address, did, network, poll=10, history_size=None, object_list=None):
+        self.points=[]
+        self.object_list=object_list
+        self.properties=FakeBAC0Properties(poll)
+        self.segmentation_supported=False
+
+    def poll(self, command='start', delay=10):
+        self.properties.pollDelay=delay if command=='start' else 0
+
+    def ping(self):
+        return False
+
+
+class FakeApplication(object):
+    """bacpypes application answering every request with the given error APDU (no answer at all if None)"""
+    def __init__(self):
+        self.error=None
+        self.requests=[]
+        self.iocbs=[]
+
+    def request_io(self, iocb):
+        self.requests.append(iocb.args[0])
+        self.iocbs.append(iocb)
+        if self.error is not None:
+            iocb.abort(self.error)
+
+
+class FakeBAC0(object):
+    """BAC0 network recording the requests, every read getting no answer"""
+    def __init__(self):
+        self._log=logging.getLogger('test')
+        self.this_application=FakeApplication()
+        self.requests=[]
+
+    def read(self, request, timeout=None):
+        self.requests.append(('read', request))
+        return None
+
+    def readMultiple(self, address, request_dict=None):
+        self.requests.append(('readMultiple', address, request_dict))
+        return {}
+
+    def write(self, request):
+        self.requests.append(('write', request))
+
+    def build_rp_request(self, args, arr_index=None):
+        return ReadProperty.build_rp_request(self, args, arr_index=arr_index)
+
+    def build_wpm_request(self, args, vendor_id=0, addr=None):
+        return ('writePropertyMultiple', addr, args)
+
+
+class FakeBAC(object):
+    """BAC object with the parts used by the devices"""
+    def __init__(self):
+        self.logger=logging.getLogger('test')
+        self.bac0=FakeBAC0()
+        self.directory=BACDeviceDirectory()
+        self.metrics=BACMetrics(self)
+        self.singleFlight=BACSingleFlight()
+        self.watchdog=BACDeviceWatchdog(self)
+        self.scheduler=BACPollScheduler(self)
+        # ticks are run by the tests
+        self.scheduler.start=lambda: None
+        self._devices=[]
+
+    def devices(self):
+        return list(self._devices)
+
+    def device(self, did):
+        for device in self._devices:
+            if device.did==did:
+                return device
+
+    def retrieveDeviceObjectList(self, did, address):
+        self.bac0.read('%s device %d objectList' % (address, did))
+        return None
+
+    def declareDevice(self, did, address, **kwargs):
+        device=BACDevice(self, did, address, **kwargs)
+        self.directory.update(did, address)
+        self._devices.append(device)
+        return device
+
+
+@pytest.fixture
+def bac(monkeypatch):
+    monkeypatch.setattr(BAC0, 'device', FakeBAC0Device)
+    return FakeBAC()
+
+
+def metadata(*points):
+    """device cache metadata of the given (objectType, instance, name) points"""
+    data={'objectList': [], 'points': {}}
+    for objectType, instance, name in points:
+        data['objectList'].append((objectType, instance))
+        data['points']['%s%d' % (objectType, instance)]={'name': name, 'description': '', 'units_state': None}
+    return data
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from bacpypes.apdu import AbortPDU
+from bacpypes.iocb import ABORTED
+
+from digimat.bac0 import bacasync
+from digimat.bac0.bacasync import AsyncBAC
+from digimat.bac0.bacbatch import BACRequestError
+from digimat.bac0.bacbreaker import BACDeviceUnavailableError
+
+
+@pytest.fixture
+def abac(bac, monkeypatch):
+    # requests are sent immediately, the bacpypes core not being run
+    monkeypatch.setattr(bacasync, 'deferred', lambda function, *args: function(*args))
+    abac=AsyncBAC(bac)
+    yield abac
+    abac.close()
+
+
+def declare(bac):
+    return bac.declareDevice(1001, '192.168.0.10', poll=0, lazy=True, objectList=[('analogInput', 1)])
+
+
+def test_timeout_aborts_the_request(bac, abac):
+    device=declare(bac)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(abac.read('192.168.0.10', 'analogInput', 1, timeout=0.05))
+
+    iocb=bac.bac0.this_application.iocbs[-1]
+    assert iocb.ioState==ABORTED
+    assert device.breaker._failures==1
+
+
+def test_cancelled_request_is_aborted(bac, abac):
+    device=declare(bac)
+
+    async def cancel():
+        task=asyncio.create_task(abac.read('192.168.0.10', 'analogInput', 1))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel())
+    assert bac.bac0.this_application.iocbs[-1].ioState==ABORTED
+    # the device's state is unknown, the breaker is left as is
+    assert device.breaker._failures==0
+    assert device.breaker.lastSuccess is None
+
+
+def test_open_breaker_fails_fast(bac, abac):
+    device=declare(bac)
+    bac.bac0.this_application.error=AbortPDU(reason='noResponse')
+
+    for n in range(3):
+        with pytest.raises(BACRequestError):
+            asyncio.run(abac.read('192.168.0.10', 'analogInput', 1))
+    assert not device.isAvailable()
+
+    with pytest.raises(BACDeviceUnavailableError):
+        asyncio.run(abac.read('192.168.0.10', 'analogInput', 1))
+    assert len(bac.bac0.this_application.requests)==3
+    device.breaker.reset()
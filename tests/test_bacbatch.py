@@ -0,0 +1,53 @@
+from bacpypes.apdu import AbortPDU, RejectPDU, Error
+from bacpypes.task import TaskManager
+
+from digimat.bac0 import bacbatch
+from digimat.bac0.bacbatch import BACRequestError, errorReason, isRejectedError, isTimeoutError
+
+
+def test_abort_reason_names():
+    error=AbortPDU(reason='noResponse')
+    assert errorReason(error)=='noResponse'
+    assert str(BACRequestError(error))=='noResponse'
+    assert isTimeoutError(error)
+    assert isTimeoutError(BACRequestError(error))
+    assert not isRejectedError(BACRequestError(error))
+
+
+def test_abort_other_reason_is_not_a_timeout():
+    error=AbortPDU(reason='segmentationNotSupported')
+    assert errorReason(error)=='segmentationNotSupported'
+    assert not isTimeoutError(BACRequestError(error))
+
+
+def test_reject_reason_names():
+    error=RejectPDU(reason='unrecognizedService')
+    assert errorReason(error)=='unrecognizedService'
+    assert str(BACRequestError(error))=='unrecognizedService'
+    assert isRejectedError(BACRequestError(error))
+    assert not isTimeoutError(BACRequestError(error))
+
+
+def test_error_code():
+    error=Error(errorClass='object', errorCode='unknownObject')
+    assert errorReason(error)=='unknownObject'
+    assert not isRejectedError(BACRequestError(error))
+    assert not isTimeoutError(BACRequestError(error))
+
+
+def test_rejected_wpm_falls_back_to_single_writes(bac, monkeypatch):
+    # requests are sent immediately, the bacpypes core not being run
+    TaskManager()
+    monkeypatch.setattr(bacbatch, 'deferred', lambda function, *args: function(*args))
+    device=bac.declareDevice(1001, '192.168.0.10', poll=0, lazy=True, objectList=[])
+    bac.bac0.this_application.error=RejectPDU(reason='unrecognizedService')
+
+    writer=device.batchWriter(window=1)
+    writer.add('analogValue', 1, 'presentValue', 21.5, key='a')
+    writer.add('analogValue', 2, 'presentValue', 22.5, key='b')
+    results=writer.write()
+
+    assert device.isWPMSupported() is False
+    assert results=={'a': True, 'b': True}
+    assert len(bac.bac0.this_application.requests)==1
+    assert len([request for request in bac.bac0.requests if request[0]=='write'])==2
@@ -0,0 +1,29 @@
+import time
+from datetime import datetime
+
+from conftest import metadata
+
+
+def test_watchdog_probes_stale_polled_device(bac):
+    device=bac.declareDevice(1001, '192.168.0.10', poll=10, lazy=True,
+        metadata=metadata(('analogInput', 1, 'temperature'), ('analogInput', 2, 'humidity')))
+    point=device.points['analogInput1']
+    # the BAC0 polling didn't update the point for a while
+    point.bac0point._history.timestamp[-1]=datetime.fromtimestamp(time.time()-600).astimezone()
+
+    last=device.lastResponse()
+    assert last is not None and time.time()-last>=600
+    assert bac.watchdog.isStale(device)
+
+    assert bac.watchdog.check()==1
+    assert bac.watchdog.probeCount==1
+    assert ('read', '192.168.0.10 device 1001 objectName') in bac.bac0.requests
+
+
+def test_watchdog_ignores_fresh_polled_device(bac):
+    device=bac.declareDevice(1001, '192.168.0.10', poll=10, lazy=True,
+        metadata=metadata(('analogInput', 1, 'temperature')))
+    device.points['analogInput1']
+
+    assert not bac.watchdog.isStale(device)
+    assert bac.watchdog.check()==0
@@ -0,0 +1,52 @@
+import time
+
+import pytest
+
+from conftest import metadata
+
+from digimat.bac0.baccov import BACCOVManager
+from digimat.bac0.bacpoint import BACPoint
+
+
+@pytest.fixture
+def manager(bac, monkeypatch):
+    monkeypatch.setattr(BACPoint, 'cov', lambda self, ttl=300: None)
+    manager=BACCOVManager(bac, spread=0.5, jitter=0)
+    # renewals are not run by the tests
+    manager.start=lambda: None
+    return manager
+
+
+def pointsDevice(bac, count):
+    device=bac.declareDevice(1001, '192.168.0.10', poll=0, lazy=True,
+        metadata=metadata(*[('analogValue', n, 'value%d' % n) for n in range(count)]))
+    device.points.materializeAll()
+    return device
+
+
+def test_budget_rejected_points_are_scheduled(bac, manager):
+    device=pointsDevice(bac, 10)
+    manager.setDeviceLimit(device.did, 4)
+    points=device.points.points
+
+    assert manager.subscribe(points, lifetime=100)==4
+    assert [s.point for s in manager.subscriptions()]==points[:4]
+    assert manager.polledPoints()==points[4:]
+    assert all(bac.scheduler.isScheduled(point) for point in points[4:])
+    assert not any(bac.scheduler.isScheduled(point) for point in points[:4])
+
+    manager.unsubscribe(points)
+    assert manager.polledPoints()==[]
+    assert bac.scheduler.entries()==[]
+
+
+def test_renewals_spread_over_accepted_subscriptions(bac, manager):
+    device=pointsDevice(bac, 10)
+    manager.setDeviceLimit(device.did, 4)
+
+    t0=time.time()
+    manager.subscribe(device.points.points, lifetime=100)
+    delays=sorted(s.renewAt-t0 for s in manager.subscriptions())
+    # renewed at 80% of the lifetime, spread over 50% of it (4 subscriptions : 80, 67.5, 55, 42.5)
+    assert delays[-1]==pytest.approx(80, abs=1)
+    assert delays[0]==pytest.approx(42.5, abs=1)
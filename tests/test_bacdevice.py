@@ -0,0 +1,27 @@
+from conftest import metadata
+
+
+def test_eager_warm_start_reads_no_metadata(bac):
+    data=metadata(('analogInput', 1, 'temperature'), ('binaryValue', 2, 'pump'), ('multiStateValue', 3, 'mode'))
+    data['objectList'].insert(0, ('device', 1001))
+    device=bac.declareDevice(1001, '192.168.0.10', poll=0, metadata=data)
+
+    assert bac.bac0.requests==[]
+    # BAC0 only declares the device object, the points are created from the cache
+    assert device.bac0device.object_list==[('device', 1001)]
+    assert [point.name for point in device.points]==['temperature', 'pump', 'mode']
+    assert device.points['pump'].descriptor=='binaryValue2'
+    assert len(device.bac0device.points)==3
+
+
+def test_eager_warm_start_cache_data(bac):
+    data=metadata(('analogInput', 1, 'temperature'), ('analogInput', 2, 'humidity'))
+    # an object filtered out of service when the entry was stored
+    data['objectList'].append(('analogInput', 3))
+    device=bac.declareDevice(1001, '192.168.0.10', poll=0, metadata=data)
+
+    assert len(device.points)==2
+    objectList, points, properties=device.cacheData()
+    assert objectList==[('analogInput', 1), ('analogInput', 2), ('analogInput', 3)]
+    assert sorted(points.keys())==['analogInput1', 'analogInput2']
+    assert bac.bac0.requests==[]
@@ -0,0 +1,26 @@
+from conftest import metadata
+
+
+OBJECTS=[('analogInput', 1), ('analogInput', 2), ('analogInput', 3)]
+
+
+def test_lazy_descriptor_creates_a_single_point(bac):
+    device=bac.declareDevice(1001, '192.168.0.10', poll=0, lazy=True, objectList=OBJECTS,
+        metadata=metadata(('analogInput', 2, 'humidity')))
+
+    point=device.points['analogInput2']
+    assert point is not None and point.name=='humidity'
+    # no objectName read of the other points to resolve the key as a name
+    assert bac.bac0.requests==[]
+    assert len(device.points)==1
+    assert device.points.isMaterialized('analogInput2')
+    assert not device.points.isMaterialized('analogInput1')
+
+
+def test_lazy_name_from_cache(bac):
+    device=bac.declareDevice(1001, '192.168.0.10', poll=0, lazy=True,
+        metadata=metadata(('analogInput', 1, 'temperature'), ('analogInput', 2, 'humidity')))
+
+    assert device.points['humidity'].descriptor=='analogInput2'
+    assert device.points[0].name=='temperature'
+    assert bac.bac0.requests==[]
@@ -0,0 +1,78 @@
+import logging
+
+from bacpypes.iocb import IOCB
+from bacpypes.apdu import ReadPropertyACK
+from bacpypes.primitivedata import Real
+from bacpypes.constructeddata import Any
+
+from BAC0.core.io.Read import ReadProperty
+
+from digimat.bac0.bacrecord import BACRecorder, BACReplay, encodeAPDU
+from digimat.bac0.bacdirectory import BACDeviceDirectory
+
+
+class FakeApplication(object):
+    def __init__(self, value=21.5):
+        self.value=value
+
+    def request_io(self, iocb):
+        request=iocb.args[0]
+        response=ReadPropertyACK(context=request)
+        response.objectIdentifier=request.objectIdentifier
+        response.propertyIdentifier=request.propertyIdentifier
+        response.propertyValue=Any(Real(self.value))
+        iocb.complete(response)
+
+
+class FakeBAC0(object):
+    def __init__(self):
+        self._log=logging.getLogger('test')
+        self.this_application=FakeApplication()
+
+
+class FakeBAC(object):
+    def __init__(self):
+        self.logger=logging.getLogger('test')
+        self.bac0=FakeBAC0()
+        self.directory=BACDeviceDirectory()
+        self.directory.update(1001, '192.168.0.10')
+
+
+def readRequest(bac):
+    # the request as built by BAC0, segmentation parameters not set yet
+    return ReadProperty.build_rp_request(bac.bac0, ['192.168.0.10', 'analogInput', 1, 'presentValue'])
+
+
+def send(bac, request):
+    iocb=IOCB(request)
+    bac.bac0.this_application.request_io(iocb)
+    return iocb
+
+
+def test_encode_request_ignores_invoke_id_and_segmentation():
+    bac=FakeBAC()
+    r1=readRequest(bac)
+    r2=readRequest(bac)
+    r2.apduInvokeID=17
+    r2.apduMaxSegs=4
+    r2.apduMaxResp=5
+    assert encodeAPDU(r1)==encodeAPDU(r2)
+
+
+def test_record_and_replay_read_property(tmp_path):
+    path=str(tmp_path / 'capture.gz')
+
+    bac=FakeBAC()
+    with BACRecorder(bac, path) as recorder:
+        iocb=send(bac, readRequest(bac))
+        assert iocb.ioResponse is not None
+    assert recorder.count==1
+
+    bac=FakeBAC()
+    bac.bac0.this_application.value=0.0
+    with BACReplay(bac, path) as replay:
+        iocb=send(bac, readRequest(bac))
+    assert replay.hitCount==1
+    assert replay.missCount==0
+    assert iocb.ioError is None
+    assert iocb.ioResponse.propertyValue.cast_out(Real)==21.5
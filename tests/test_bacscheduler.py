@@ -0,0 +1,47 @@
+import time
+
+from conftest import metadata
+
+from digimat.bac0.bacscheduler import BACPollScheduler
+
+
+def pointsDevice(bac, did, count):
+    device=bac.declareDevice(did, '192.168.0.%d' % did, poll=0, lazy=True,
+        metadata=metadata(*[('analogValue', n, 'value%d' % n) for n in range(count)]))
+    device.points.materializeAll()
+    return device
+
+
+def scheduler(bac, **kwargs):
+    scheduler=BACPollScheduler(bac, **kwargs)
+    scheduler.start=lambda: None
+    return scheduler
+
+
+def test_rpm_device_budget_counts_requests(bac):
+    device=pointsDevice(bac, 10, 4)
+    s=scheduler(bac, deviceBudget=2)
+    s.add(device.points.points)
+    devices=s._dueEntries(time.time()+1)
+    # every point fits in a single RPM request
+    assert len(devices[device])==4
+
+
+def test_non_rpm_device_budget_counts_property_reads(bac):
+    device=pointsDevice(bac, 10, 4)
+    device.setRPMSupported(False)
+    s=scheduler(bac, deviceBudget=4)
+    s.add(device.points.points)
+    devices=s._dueEntries(time.time()+1)
+    # 2 properties read per point
+    assert len(devices[device])==2
+    assert len(s._queue)==2
+
+
+def test_non_rpm_device_polled_even_with_a_small_budget(bac):
+    device=pointsDevice(bac, 10, 4)
+    device.setRPMSupported(False)
+    s=scheduler(bac, deviceBudget=1)
+    s.add(device.points.points)
+    devices=s._dueEntries(time.time()+1)
+    assert len(devices[device])==1